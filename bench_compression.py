@@ -0,0 +1,109 @@
+# bench_compression.py
+# Mede bytes e CPU da cadeia em JSON/binário, sem compressão, com gzip e com zstd (se instalado),
+# tanto no corpo de /chain quanto no log de blocos em disco.
+#
+# Uso: python bench_compression.py [quantidade de blocos ...]   (padrão: 10000 100000)
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from Crypto.PublicKey import ECC
+import codec
+import compression
+from storage import BlockStore
+
+KEY_POOL_SIZE = 50 # Contas distintas na cadeia sintética (cartórios, donos, mineradores)
+TX_TYPES = ('MINT_TOKEN', 'REQUEST_SALE_APPROVAL', 'APPROVE_SALE', 'EXECUTE_SALE_CONTRACT')
+# Segmentos menores que o padrão (8 MB) para que a maior parte da cadeia esteja em segmentos
+# fechados (comprimidos) já com 10 mil blocos; o segmento atual nunca é comprimido.
+BENCH_SEGMENT_BYTES = 1024 * 1024
+
+
+def synthetic_chain(length, seed=42):
+    """Cadeia com o formato real (chaves PEM, assinaturas e hashes em hexadecimal), sem PoW nem assinaturas válidas."""
+    rng = random.Random(seed)
+    keys = [ECC.generate(curve='P-256').public_key().export_key(format='PEM').strip() for _ in range(KEY_POOL_SIZE)]
+    chain, timestamp = [], 1700000000.0
+    for index in range(1, length + 1):
+        timestamp += rng.uniform(5, 60)
+        miner, sender, recipient = rng.sample(keys, 3)
+        tx_type = rng.choice(TX_TYPES)
+        transactions = [{
+            'transaction': {'sender': sender, 'recipient': recipient, 'data': {
+                'type': tx_type,
+                'payload': {'token_id': f'CASA-[{index}]', 'locality': rng.choice(('Recife', 'Olinda', 'Caruaru')),
+                            'price': rng.randint(1000, 500000), 'details_hash': '%064x' % rng.getrandbits(256)}}},
+            'signature': '%0128x' % rng.getrandbits(512)
+        }, {
+            'transaction': {'sender': '0', 'recipient': miner, 'data': {'type': 'MINING_REWARD'}},
+            'signature': 'reward'
+        }]
+        chain.append({'index': index, 'timestamp': timestamp, 'transactions': transactions,
+                      'proof': rng.randint(0, 10 ** 6), 'previous_hash': '%064x' % rng.getrandbits(256)})
+    return chain
+
+
+def timed(function, *args):
+    start = time.process_time()
+    result = function(*args)
+    return result, time.process_time() - start
+
+
+def bench_wire(chain):
+    """Corpo de /chain: serialização + compressão no servidor, descompressão + leitura no cliente."""
+    payload = {'chain': chain, 'length': len(chain)}
+    formats = {
+        'json': (lambda value: json.dumps(value).encode(), json.loads),
+        'binary': (codec.encode, codec.decode),
+    }
+    print(f"  {'corpo de /chain':<22}{'bytes':>14}{'razão':>8}{'CPU envio (s)':>15}{'CPU leitura (s)':>17}")
+    baseline = None
+    for name, (encode, decode) in formats.items():
+        data, encode_time = timed(encode, payload)
+        for encoding in (None,) + compression.ENCODINGS:
+            body, compress_time = (data, 0.0) if encoding is None else timed(compression.compress, data, encoding)
+            raw, decompress_time = (body, 0.0) if encoding is None else timed(compression.decompress, body, encoding)
+            _, decode_time = timed(decode, raw)
+            baseline = baseline or len(body)
+            label = f"{name}+{encoding}" if encoding else name
+            print(f"  {label:<22}{len(body):>14,}{baseline / len(body):>8.1f}"
+                  f"{encode_time + compress_time:>15.2f}{decompress_time + decode_time:>17.2f}")
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def bench_disk(chain):
+    """Log de blocos: gravação completa e leitura em fluxo (como na inicialização do nó)."""
+    print(f"  {'log em disco':<22}{'bytes':>14}{'razão':>8}{'CPU gravação (s)':>18}{'CPU leitura (s)':>17}")
+    baseline = None
+    for block_format in ('json', 'binary'):
+        for encoding in (None,) + compression.ENCODINGS:
+            directory = tempfile.mkdtemp(prefix='bench_store_')
+            try:
+                options = {'segment_max_bytes': BENCH_SEGMENT_BYTES, 'block_format': block_format, 'compression': encoding}
+                store = BlockStore(directory, **options)
+                _, write_time = timed(store.extend, chain)
+                store = BlockStore(directory, **options)
+                _, read_time = timed(lambda: sum(1 for _ in store.iter_blocks()))
+                size = directory_size(directory)
+            finally:
+                shutil.rmtree(directory)
+            baseline = baseline or size
+            label = f"{block_format}+{encoding}" if encoding else block_format
+            print(f"  {label:<22}{size:>14,}{baseline / size:>8.1f}{write_time:>18.2f}{read_time:>17.2f}")
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000]
+    if 'zstd' not in compression.ENCODINGS:
+        print("(pacote 'zstandard' não instalado: zstd fora da comparação)")
+    for size in sizes:
+        print(f"\n=== {size:,} blocos ===")
+        chain = synthetic_chain(size)
+        bench_wire(chain)
+        bench_disk(chain)
@@ -0,0 +1,139 @@
+# bench_server.py
+# Teste de carga dos endpoints entre nós (/chain, /headers, /blocks, /new_block) comparando o servidor
+# de desenvolvimento do Flask com o servidor do nó (server.py: Werkzeug com pool e, se instalado, waitress).
+#
+# Os clientes rodam em processos separados para não disputar o GIL com o servidor medido.
+# Uso: python bench_server.py [blocos na cadeia] [processos clientes] [threads por processo] [segundos]
+#      (padrão: 2000 4 8 10)
+import contextlib
+import io
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import requests
+from werkzeug.serving import make_server
+
+import main
+import server
+from bench_compression import synthetic_chain
+from blockchain import Blockchain
+
+# Mistura de requisições de um nó que sincroniza e propaga blocos
+REQUEST_MIX = (('headers', 0.45), ('blocks', 0.3), ('new_block', 0.2), ('chain', 0.05))
+
+
+class _BenchNode:
+    """O mínimo de MainApplication usado pelos endpoints entre nós."""
+
+    def __init__(self, blockchain):
+        self.blockchain = blockchain
+        self.chain_lock = threading.Lock()
+        self.tip_changed = threading.Condition(self.chain_lock)
+        self.tip_waiters = 0
+        self.tip_watcher = None
+        self.pow_engine = None
+        self.gui_queue = []
+
+    def log_event(self, *args):
+        pass
+
+
+def _client(base_url, seconds, threads, seed):
+    """Dispara requisições por 'seconds' segundos; retorna [(latência, status)]."""
+    results, lock = [], threading.Lock()
+    stale_block = {'index': 2, 'timestamp': 0.0, 'transactions': [], 'proof': 0, 'previous_hash': '0' * 64}
+
+    def worker(worker_seed):
+        rng = random.Random(worker_seed)
+        session = requests.Session()
+        response = session.get(f'{base_url}/headers', params={'from': 1}, timeout=30)
+        while response.status_code != 200: # Servidor lotado (503): tenta de novo
+            time.sleep(0.1)
+            response = session.get(f'{base_url}/headers', params={'from': 1}, timeout=30)
+        length = response.json()['length']
+        names, weights = zip(*REQUEST_MIX)
+        deadline = time.time() + seconds
+        while time.time() < deadline:
+            kind = rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                if kind == 'headers':
+                    response = session.get(f'{base_url}/headers', params={'from': rng.randint(1, length)}, timeout=30)
+                elif kind == 'blocks':
+                    first = rng.randint(1, max(length - 50, 1))
+                    response = session.get(f'{base_url}/blocks', params={'from': first, 'to': first + 49}, timeout=30)
+                elif kind == 'chain':
+                    response = session.get(f'{base_url}/chain', timeout=30)
+                else: # Bloco antigo: exercita validação e chain_lock, e é recusado
+                    response = session.post(f'{base_url}/new_block', json=stale_block, timeout=30)
+                status = response.status_code
+            except requests.exceptions.RequestException:
+                status = None
+            with lock:
+                results.append((time.perf_counter() - start, status))
+
+    pool = [threading.Thread(target=worker, args=(seed * 1000 + i,)) for i in range(threads)]
+    for thread in pool: thread.start()
+    for thread in pool: thread.join()
+    return results
+
+
+def _start_server(mode, app):
+    """Sobe o servidor numa porta livre; retorna (porta, função para parar)."""
+    if mode == 'flask-dev':
+        httpd = make_server('127.0.0.1', 0, app, threaded=True) # O que app_flask.run() usa
+    elif mode == 'werkzeug-pool':
+        httpd = server.BoundedWSGIServer('127.0.0.1', 0, app)
+    else:
+        httpd = server.waitress.create_server(app, host='127.0.0.1', port=0, threads=server.SERVER_THREADS,
+                                              connection_limit=server.SERVER_THREADS + server.MAX_QUEUED_REQUESTS,
+                                              channel_timeout=server.REQUEST_TIMEOUT, ident=None)
+        threading.Thread(target=httpd.run, daemon=True).start()
+        return httpd.effective_port, httpd.close
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd.server_port, lambda: (httpd.shutdown(), httpd.server_close())
+
+
+def _percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0.0
+
+
+def bench(mode, processes, threads, seconds):
+    port, stop = _start_server(mode, main.app_flask)
+    base_url = f'http://127.0.0.1:{port}'
+    context = multiprocessing.get_context('spawn')
+    try:
+        # Os prints do nó (blocos recusados) custariam mais que as próprias requisições
+        with contextlib.redirect_stdout(io.StringIO()), ProcessPoolExecutor(max_workers=processes, mp_context=context) as pool:
+            futures = [pool.submit(_client, base_url, seconds, threads, seed) for seed in range(processes)]
+            results = [item for future in futures for item in future.result()]
+    finally:
+        stop()
+    latencies = sorted(latency for latency, status in results if status is not None and status < 500)
+    busy = sum(1 for _, status in results if status == 503)
+    failed = sum(1 for _, status in results if status is None or (status >= 500 and status != 503))
+    print(f"  {mode:<15}{len(latencies) / seconds:>10.0f}{_percentile(latencies, 0.5) * 1000:>10.1f}"
+          f"{_percentile(latencies, 0.95) * 1000:>10.1f}{_percentile(latencies, 0.99) * 1000:>10.1f}{busy:>8}{failed:>8}")
+
+
+if __name__ == '__main__':
+    chain_length, processes, threads, seconds = ([int(arg) for arg in sys.argv[1:5]] + [2000, 4, 8, 10][len(sys.argv[1:5]):])
+    os.chdir(tempfile.mkdtemp(prefix='bench_server_'))
+    logging.getLogger('werkzeug').setLevel(logging.ERROR) # Log de acesso do servidor de desenvolvimento
+    logging.getLogger('waitress').setLevel(logging.ERROR) # Avisos de fila e de limite de conexões a cada requisição
+    blockchain = Blockchain(0, 'governo', 'receita')
+    blockchain.chain = synthetic_chain(chain_length)
+    blockchain._block_hashes = {}
+    main.main_app = _BenchNode(blockchain)
+
+    modes = ['flask-dev', 'werkzeug-pool'] + (['waitress'] if server.waitress else [])
+    print(f"Cadeia de {chain_length} blocos; {processes} processos x {threads} threads clientes; {seconds}s por servidor.")
+    print(f"  {'servidor':<15}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'503':>8}{'erros':>8}")
+    for mode in modes:
+        bench(mode, processes, threads, seconds)
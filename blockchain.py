@@ -3,18 +3,43 @@ import hashlib
 import json
 import time
 import requests
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from wallet import Wallet
+from mempool import Mempool
+from transaction import EncodedTransaction, encode_transactions, hash_block
+import codec
+from network import PeerManager
+from storage import BlockStore, CheckpointStore
+from verification import signed_transactions, find_invalid_signature
 import os
+from itertools import islice
+from bisect import bisect_left, bisect_right
 
 MINING_REWARD = 100
 FAUCET_REWARD = 100
 TAX_RATE = 0.05 # 5% de imposto (ITBI)
+CHECKPOINT_INTERVAL = 100 # Salva um checkpoint do estado a cada N blocos
+UNDO_DEPTH = CHECKPOINT_INTERVAL # Blocos recentes cujo journal de desfazer é guardado (reorganização sem reindex)
+SYNC_TIMEOUT = 2 # Timeout (s) de cada pedido HTTP a um vizinho
+SYNC_DEADLINE = 3 # Prazo (s) de uma rodada de sincronização com todos os vizinhos
+MAX_SYNC_WORKERS = 8
+MAX_HEADERS_PER_REQUEST = 2000
+MAX_BLOCKS_PER_REQUEST = 500
+# Teto do que uma rodada de sincronização baixa de um vizinho: as assinaturas são verificadas no fim da
+# rodada e precisam caber no prazo. Um nó muito atrasado avança uma fatia por rodada.
+MAX_BLOCKS_PER_SYNC_ROUND = MAX_BLOCKS_PER_REQUEST
+MAX_SIGNATURES_PER_SYNC_ROUND = 1000
+# Pede aos vizinhos o formato binário; nós antigos ignoram e respondem em JSON
+SYNC_HEADERS = {'Accept': f'{codec.BINARY_MEDIA_TYPE}, application/json;q=0.9'}
+
+_MISSING = object() # Marca chaves inexistentes no journal de desfazer
 
 class Blockchain:
-    def __init__(self, port, government_public_key, tax_authority_public_key):
+    def __init__(self, port, government_public_key, tax_authority_public_key, reindex=False, block_format='json',
+                 storage_compression=None):
         self.chain = []
-        self.pending_transactions = []
-        self.nodes = set()
+        self.mempool = Mempool() # Transações pendentes, indexadas pelo hash
+        self.peers = PeerManager() # Vizinhos, com latência, falhas e espera (backoff) de cada um
         self.port = port
         
         # CORREÇÃO: Garante que as chaves de configuração sejam armazenadas limpas
@@ -23,42 +48,196 @@ class Blockchain:
 
         self.blockchain_dir = "data/blockchain"
         os.makedirs(self.blockchain_dir, exist_ok=True)
-        self.chain_file = os.path.join(self.blockchain_dir, f'blockchain_{self.port}.json')
+        self.chain_file = os.path.join(self.blockchain_dir, f'blockchain_{self.port}.json') # Formato antigo (migrado na carga)
+        self.store = BlockStore(os.path.join(self.blockchain_dir, f'blocks_{self.port}'), block_format=block_format,
+                                compression=storage_compression)
+        self.checkpoints = CheckpointStore(os.path.join(self.blockchain_dir, f'checkpoints_{self.port}'))
+        self.reindex_on_load = reindex # Ignora checkpoints e reprocessa tudo desde o gênesis
 
-        self.state = {
-            'balances': {},
-            'tokens': {},
-            'contracts': {},
-            'authorized_notaries': set(),
-            'certified_identities': set(),
-            'notary_locations': {},
-            'token_metadata': {},       # {token_id: {locality: "...", asset_type: "...", area: "...", details_hash: "...", ...}}
-            'pending_sale_requests': {},
-            'tax_receipts': []
-        }
+        self.state = self._empty_state()
+        self._journal = None # Lista de desfazer (undo) do bloco sendo aplicado
+        self._undo_journals = {} # {índice do bloco: journal} dos últimos UNDO_DEPTH blocos aplicados
+        self._block_hashes = {} # Cache {índice do bloco: hash}, invalidado quando a cadeia muda
+        self.signature_verifier = None # SignatureVerifier (em paralelo); sem ele a verificação é serial
 
         self.load_chain_and_rebuild_state()
 
         if not self.chain:
             self.create_block(previous_hash='0', proof=100)
 
-    def rebuild_state_from_chain(self):
-        self.state = {
+    @staticmethod
+    def _empty_state():
+        return {
             'balances': {},
             'tokens': {},
             'contracts': {},
             'authorized_notaries': set(),
             'certified_identities': set(),
             'notary_locations': {},
-            'token_metadata': {},
+            'token_metadata': {},       # {token_id: {locality: "...", asset_type: "...", area: "...", details_hash: "...", ...}}
             'pending_sale_requests': {},
-            'tax_receipts': []
+            'tax_receipts': [],
+            # Índices derivados, mantidos durante a aplicação das transações
+            'token_events': {},         # {token_id: [[índice do bloco, posição da tx, tipo do evento], ...]}
+            'owner_tokens': {},         # {dono: set(token_id)}
+            'open_contracts_by_token': {}, # {token_id: set(contract_id)}, só contratos OPEN
+            'sale_requests_by_token': {},  # {token_id: {request_id: [bloco, posição]}}, só PENDING/REJECTED, do mais antigo ao mais novo
+            'pending_by_locality': {},  # {localidade: {request_id: [bloco, posição]}}, só PENDING, da mais antiga à mais nova
+            'receipts_by_buyer': {},    # {comprador: [posições em tax_receipts]}
+            'receipts_by_seller': {},   # {vendedor: [posições em tax_receipts]}
+            'receipts_by_token': {},    # {token_id: [posições em tax_receipts]}
+            'tx_locations': {}          # {hash da transação: [índice do bloco, posição]}, primeira inclusão
         }
+
+    def rebuild_state_from_chain(self):
+        self.state = self._empty_state()
+        self._undo_journals = {}
         for block in self.chain:
-            for tx_data in block['transactions']:
-                self._process_transaction_for_state_update(tx_data)
+            self._process_block(block)
 
-    def _process_transaction_for_state_update(self, tx_data):
+    def _process_block(self, block, encoded_transactions=None):
+        if encoded_transactions is None:
+            encoded_transactions = encode_transactions(block)
+        for position, encoded in enumerate(encoded_transactions):
+            self._index_transaction(encoded.hash, block['index'], position)
+            self._process_transaction_for_state_update(encoded.tx_data, block['index'], position, encoded.hash)
+
+    def _index_transaction(self, tx_hash, block_index, tx_position):
+        if tx_hash not in self.state['tx_locations']:
+            self._state_put('tx_locations', tx_hash, [block_index, tx_position])
+
+    def reindex(self):
+        """Reprocessa todo o estado a partir do gênesis (operação explícita e cara)."""
+        start = time.time()
+        self.rebuild_state_from_chain()
+        print(f"[Reindex] Estado reconstruído a partir de {len(self.chain)} blocos em {time.time() - start:.2f}s.")
+
+    # --- Escritas no estado com registro de desfazer (undo) ---
+    # Toda alteração feita por _process_transaction_for_state_update passa por aqui.
+    # Enquanto um bloco está sendo aplicado, cada escrita guarda o valor anterior em
+    # self._journal, permitindo reverter o bloco sem reprocessar a cadeia.
+    def _state_put(self, table, key, value):
+        if self._journal is not None:
+            self._journal.append(('put', table, key, self.state[table].get(key, _MISSING)))
+        self.state[table][key] = value
+
+    def _state_add(self, table, member):
+        if member in self.state[table]: return
+        if self._journal is not None:
+            self._journal.append(('add', table, member, None))
+        self.state[table].add(member)
+
+    def _state_append(self, table, item):
+        if self._journal is not None:
+            self._journal.append(('append', table, None, None))
+        self.state[table].append(item)
+
+    def _state_append_to(self, table, key, item):
+        """Acrescenta 'item' à lista self.state[table][key] (criando-a se preciso)."""
+        if self._journal is not None:
+            self._journal.append(('append_to', table, key, None))
+        self.state[table].setdefault(key, []).append(item)
+
+    def _state_add_to(self, table, key, member):
+        """Inclui 'member' no conjunto self.state[table][key] (criando-o se preciso)."""
+        members = self.state[table].setdefault(key, set())
+        if member in members: return
+        if self._journal is not None:
+            self._journal.append(('add_to', table, key, member))
+        members.add(member)
+
+    def _state_discard_from(self, table, key, member):
+        members = self.state[table].get(key)
+        if not members or member not in members: return
+        if self._journal is not None:
+            self._journal.append(('discard_from', table, key, member))
+        members.discard(member)
+        if not members: del self.state[table][key]
+
+    def _state_put_in(self, table, key, subkey, value):
+        """self.state[table][key][subkey] = value, criando o dicionário interno se preciso."""
+        bucket = self.state[table].setdefault(key, {})
+        if self._journal is not None:
+            self._journal.append(('put_in', table, (key, subkey), bucket.get(subkey, _MISSING)))
+        bucket[subkey] = value
+
+    def _state_delete_in(self, table, key, subkey):
+        bucket = self.state[table].get(key)
+        if not bucket or subkey not in bucket: return
+        if self._journal is not None:
+            self._journal.append(('delete_in', table, (key, subkey), bucket[subkey]))
+        del bucket[subkey]
+        if not bucket: del self.state[table][key]
+
+    def _rollback(self, journal, mark=0):
+        """Desfaz as entradas do journal (em ordem reversa) até a posição 'mark'."""
+        while len(journal) > mark:
+            op, table, key, old = journal.pop()
+            if op == 'put':
+                if old is _MISSING: self.state[table].pop(key, None)
+                else: self.state[table][key] = old
+            elif op == 'add':
+                self.state[table].discard(key)
+            elif op == 'append':
+                self.state[table].pop()
+            elif op == 'append_to':
+                items = self.state[table][key]
+                items.pop()
+                if not items: del self.state[table][key]
+            elif op == 'add_to':
+                members = self.state[table][key]
+                members.discard(old)
+                if not members: del self.state[table][key]
+            elif op == 'discard_from':
+                self.state[table].setdefault(key, set()).add(old)
+            elif op == 'put_in':
+                bucket_key, subkey = key
+                bucket = self.state[table][bucket_key]
+                if old is _MISSING:
+                    del bucket[subkey]
+                    if not bucket: del self.state[table][bucket_key]
+                else: bucket[subkey] = old
+            elif op == 'delete_in':
+                # Reinsere e reordena pelo valor, preservando a ordem de chegada do dicionário interno
+                bucket_key, subkey = key
+                bucket = self.state[table].setdefault(bucket_key, {})
+                bucket[subkey] = old
+                self.state[table][bucket_key] = dict(sorted(bucket.items(), key=lambda item: item[1]))
+
+    def _apply_block(self, block, encoded_transactions=None):
+        """Aplica ao estado apenas as transações do bloco. Se alguma falhar, o bloco inteiro é revertido."""
+        journal = self._journal = []
+        try:
+            self._process_block(block, encoded_transactions)
+        except Exception as e:
+            self._rollback(self._journal)
+            print(f"[Apply Block] Falha ao aplicar bloco #{block.get('index')}: {e}. Estado revertido.")
+            return False
+        finally:
+            self._journal = None
+        self._keep_undo_journal(block['index'], journal)
+        return True
+
+    def _keep_undo_journal(self, block_index, journal):
+        """Guarda o journal do bloco para uma futura reorganização; descarta o que passou de UNDO_DEPTH."""
+        self._undo_journals[block_index] = journal
+        self._undo_journals.pop(block_index - UNDO_DEPTH, None)
+
+    def _rewind(self, height):
+        """Remove os blocos acima de 'height' desfazendo o estado deles pelos journals. Retorna os blocos removidos."""
+        removed = []
+        while len(self.chain) > height:
+            self._rollback(self._undo_journals.pop(len(self.chain)))
+            removed.append(self.chain.pop())
+        self._invalidate_block_hashes(height)
+        removed.reverse()
+        return removed
+
+    def _record_token_event(self, token_id, block_index, tx_position, event_type):
+        if block_index is not None and tx_position is not None:
+            self._state_append_to('token_events', token_id, [block_index, tx_position, event_type])
+
+    def _process_transaction_for_state_update(self, tx_data, block_index=None, tx_position=None, tx_hash=None):
         tx = tx_data['transaction']
         tx_type = tx['data'].get('type')
         payload = tx['data'].get('payload', {})
@@ -72,7 +251,7 @@ class Blockchain:
 
         if sender == "0":
             reward = MINING_REWARD if tx_type == 'MINING_REWARD' else FAUCET_REWARD
-            self.state['balances'][recipient] = recipient_balance + reward
+            self._state_put('balances', recipient, recipient_balance + reward)
             return
             
         if tx_type == 'MINT_TOKEN':
@@ -85,9 +264,10 @@ class Blockchain:
                 details_hash = payload.get('details_hash')
                 
                 if token_id and locality and asset_type and area and details_hash and (token_id not in self.state['tokens']):
-                    self.state['tokens'][token_id] = recipient # recipient é o primeiro dono (já limpo)
+                    self._state_put('tokens', token_id, recipient) # recipient é o primeiro dono (já limpo)
+                    self._state_add_to('owner_tokens', recipient, token_id)
                     
-                    self.state['token_metadata'][token_id] = {
+                    self._state_put('token_metadata', token_id, {
                         'locality': locality,
                         'asset_type': asset_type,
                         'area': area,
@@ -95,7 +275,8 @@ class Blockchain:
                         'minted_by': sender, # sender já está limpo
                         'gov_issues': False,
                         'paid_off': True
-                    }
+                    })
+                    self._record_token_event(token_id, block_index, tx_position, tx_type)
                     print(f"[State Update] Ativo {token_id} mintado em {locality}.")
             else:
                  print(f"[State Update] Falha no MINT: Remetente {sender[:10]}... não é um cartório autorizado.")
@@ -103,8 +284,8 @@ class Blockchain:
         elif tx_type == 'TRANSFER_CURRENCY':
             amount = payload.get('amount')
             if sender_balance >= amount:
-                self.state['balances'][sender] = sender_balance - amount
-                self.state['balances'][recipient] = recipient_balance + amount
+                self._state_put('balances', sender, sender_balance - amount)
+                self._state_put('balances', recipient, recipient_balance + amount)
         
         elif tx_type == 'REGISTER_NOTARY':
             # CORREÇÃO: Compara sender (limpo) com a chave do gov (limpa)
@@ -112,8 +293,8 @@ class Blockchain:
                 notary_pk = recipient # recipient já está limpo
                 locality = payload.get('locality')
                 if notary_pk and locality:
-                    self.state['authorized_notaries'].add(notary_pk)
-                    self.state['notary_locations'][notary_pk] = locality
+                    self._state_add('authorized_notaries', notary_pk)
+                    self._state_put('notary_locations', notary_pk, locality)
                     print(f"[State Update] Cartório {notary_pk[:10]}... adicionado em {locality}.")
             else:
                 print(f"[State Update] Falha ao registrar cartório: Remetente não é o governo.")
@@ -121,7 +302,7 @@ class Blockchain:
         elif tx_type == 'CERTIFY_IDENTITY':
             # CORREÇÃO: Compara sender (limpo)
             if sender in self.state['authorized_notaries']:
-                self.state['certified_identities'].add(recipient) # recipient já está limpo
+                self._state_add('certified_identities', recipient) # recipient já está limpo
                 print(f"[State Update] Identidade {recipient[:10]}... certificada por {sender[:10]}.")
         
         elif tx_type == 'REQUEST_SALE_APPROVAL':
@@ -132,13 +313,16 @@ class Blockchain:
                 token_metadata = self.state.get('token_metadata', {}).get(token_id, {})
                 token_locality = token_metadata.get('locality')
                 if request_id and token_locality:
-                    self.state['pending_sale_requests'][request_id] = {
+                    self._state_put('pending_sale_requests', request_id, {
                         'token_id': token_id,
                         'seller': sender,
                         'price': payload.get('price'),
                         'status': 'PENDING',
                         'locality': token_locality
-                    }
+                    })
+                    self._state_put_in('sale_requests_by_token', token_id, request_id, [block_index or 0, tx_position or 0])
+                    self._state_put_in('pending_by_locality', token_locality, request_id, [block_index or 0, tx_position or 0])
+                    self._record_token_event(token_id, block_index, tx_position, tx_type)
                     print(f"[State Update] Solicitação de Venda {request_id[:8]}... criada para {token_id} em {token_locality}.")
 
         elif tx_type == 'APPROVE_SALE':
@@ -149,9 +333,12 @@ class Blockchain:
 
                 notary_locality = self.state['notary_locations'].get(sender)
                 if request and request['status'] == 'PENDING' and request['locality'] == notary_locality:
-                    request['status'] = 'APPROVED'
+                    self._state_put('pending_sale_requests', request_id, {**request, 'status': 'APPROVED'})
                     contract_id = payload.get('contract_id')
-                    self.state['contracts'][contract_id] = {
+                    replaced = self.state['contracts'].get(contract_id)
+                    if replaced and replaced['status'] == 'OPEN':
+                        self._state_discard_from('open_contracts_by_token', replaced['token_id'], contract_id)
+                    self._state_put('contracts', contract_id, {
                         'token_id': request['token_id'],
                         'seller': request['seller'],
                         'price': request['price'],
@@ -159,7 +346,11 @@ class Blockchain:
                         'valid_until': payload.get('valid_until'),
                         'approved_by': sender,
                         'original_request_id': request_id
-                    }
+                    })
+                    self._state_add_to('open_contracts_by_token', request['token_id'], contract_id)
+                    self._state_delete_in('sale_requests_by_token', request['token_id'], request_id)
+                    self._state_delete_in('pending_by_locality', request['locality'], request_id)
+                    self._record_token_event(request['token_id'], block_index, tx_position, tx_type)
                     print(f"[State Update] Venda {request_id[:8]}... APROVADA. Contrato {contract_id[:8]}... criado.")
 
         elif tx_type == 'REJECT_SALE':
@@ -169,9 +360,11 @@ class Blockchain:
                 request = self.state['pending_sale_requests'].get(request_id)
                 notary_locality = self.state['notary_locations'].get(sender)
                 if request and request['status'] == 'PENDING' and request['locality'] == notary_locality:
-                    request['status'] = 'REJECTED'
-                    request['reason'] = payload.get('reason')
-                    request['rejected_by'] = sender
+                    self._state_put('pending_sale_requests', request_id, {
+                        **request, 'status': 'REJECTED', 'reason': payload.get('reason'), 'rejected_by': sender
+                    })
+                    self._state_delete_in('pending_by_locality', request['locality'], request_id)
+                    self._record_token_event(request['token_id'], block_index, tx_position, tx_type)
                     print(f"[State Update] Venda {request_id[:8]}... REJEITADA. Motivo: {payload.get('reason')}")
 
         elif tx_type == 'EXECUTE_SALE_CONTRACT':
@@ -181,7 +374,8 @@ class Blockchain:
 
             if not (contract and contract['status'] == 'OPEN'): return
             if contract.get('valid_until', float('inf')) < time.time():
-                self.state['contracts'][contract_id]['status'] = 'EXPIRED'
+                self._state_put('contracts', contract_id, {**contract, 'status': 'EXPIRED'})
+                self._state_discard_from('open_contracts_by_token', contract['token_id'], contract_id)
                 return
 
             price = contract['price']
@@ -197,17 +391,20 @@ class Blockchain:
             seller_balance = self.state['balances'].get(seller, 0)
             tax_auth_balance = self.state['balances'].get(self.tax_authority_public_key, 0)
 
-            self.state['balances'][buyer] = sender_balance - total_cost
-            self.state['balances'][seller] = seller_balance + price
-            self.state['balances'][self.tax_authority_public_key] = tax_auth_balance + tax
-            self.state['tokens'][token_id] = buyer
-            self.state['contracts'][contract_id]['status'] = 'CLOSED'
-            self.state['contracts'][contract_id]['buyer'] = buyer
+            self._state_put('balances', buyer, sender_balance - total_cost)
+            self._state_put('balances', seller, seller_balance + price)
+            self._state_put('balances', self.tax_authority_public_key, tax_auth_balance + tax)
+            previous_owner = self.state['tokens'].get(token_id) # Pode não ser o vendedor do contrato (dois contratos do mesmo token)
+            self._state_put('tokens', token_id, buyer)
+            self._state_discard_from('owner_tokens', previous_owner, token_id)
+            self._state_add_to('owner_tokens', buyer, token_id)
+            self._state_discard_from('open_contracts_by_token', token_id, contract_id)
+            self._state_put('contracts', contract_id, {**contract, 'status': 'CLOSED', 'buyer': buyer})
 
             receipt = {
-                'receipt_id': hashlib.sha256(json.dumps(tx, sort_keys=True).encode()).hexdigest(),
+                'receipt_id': tx_hash or self.hash_transaction(tx),
                 'timestamp': time.time(),
-                'block_index': len(self.chain) + 1,
+                'block_index': block_index if block_index is not None else len(self.chain) + 1,
                 'token_id': token_id,
                 'buyer': buyer,
                 'seller': seller,
@@ -215,55 +412,130 @@ class Blockchain:
                 'tax_paid': tax,
                 'tax_authority_recipient': self.tax_authority_public_key
             }
-            self.state['tax_receipts'].append(receipt)
+            receipt_position = len(self.state['tax_receipts'])
+            self._state_append('tax_receipts', receipt)
+            self._state_append_to('receipts_by_buyer', buyer, receipt_position)
+            self._state_append_to('receipts_by_seller', seller, receipt_position)
+            self._state_append_to('receipts_by_token', token_id, receipt_position)
+            self._record_token_event(token_id, block_index, tx_position, tx_type)
             print(f"[State Update] Venda Concluída. Token {token_id} transferido para {buyer[:10]}...")
             print(f"[State Update] Imposto de {tax} moedas pago para {self.tax_authority_public_key[:10]}...")
 
-    def save_chain(self):
-        chain_to_save = []
-        for block in self.chain:
-            block_copy = block.copy()
-            chain_to_save.append(block_copy)
+    def save_chain(self, fork_height=None):
+        """Persiste a cadeia no log append-only.
+
+        Sem 'fork_height', apenas os blocos ainda não gravados são anexados (O(1) por bloco).
+        Com 'fork_height', os blocos gravados acima dessa altura são descartados antes.
+        """
         try:
-            with open(self.chain_file, 'w') as f:
-                json.dump(chain_to_save, f, indent=4)
+            if fork_height is not None:
+                self.store.truncate(fork_height)
+            self.store.extend(self.chain[len(self.store):])
         except Exception as e:
-            print(f"Erro ao salvar chain.json: {e}")
+            print(f"Erro ao salvar blocos em {self.store.directory}: {e}")
 
     def load_chain_and_rebuild_state(self):
         try:
-            with open(self.chain_file, 'r') as f: self.chain = json.load(f)
-            self.rebuild_state_from_chain()
-            # Converte listas (que podem estar no JSON) de volta para SETs
-            self.state['authorized_notaries'] = set(self.state.get('authorized_notaries', []))
-            self.state['certified_identities'] = set(self.state.get('certified_identities', []))
-        except (FileNotFoundError, json.JSONDecodeError):
-            self.chain = []
+            if not len(self.store) and os.path.exists(self.chain_file):
+                self._migrate_legacy_chain_file()
+            self.chain = list(self.store.iter_blocks())
+            self._block_hashes = {}
+            if self.reindex_on_load or not self._restore_from_checkpoint():
+                self.rebuild_state_from_chain()
+        except (OSError, ValueError) as e: # ValueError inclui JSON inválido e registro binário corrompido
+            print(f"Erro ao carregar blocos de {self.store.directory}: {e}")
+            # Recomeça do gênesis: o log ilegível é descartado para que o novo gênesis seja gravado no lugar dele
+            self.chain, self.state = [], self._empty_state()
+            self._undo_journals, self._block_hashes = {}, {}
+            self.store.truncate(0)
+            self.checkpoints.discard_above(0)
+
+    def save_checkpoint(self):
+        """Grava o estado atual junto com a altura e o hash do último bloco."""
+        if not self.chain: return
+        try:
+            self.checkpoints.save(len(self.chain), self.get_block_hash(len(self.chain)), self.state)
+            print(f"[Checkpoint] Estado salvo na altura {len(self.chain)}.")
+        except (OSError, TypeError) as e:
+            print(f"[Checkpoint] Erro ao salvar checkpoint: {e}")
+
+    def _maybe_checkpoint(self):
+        if self.chain and len(self.chain) % CHECKPOINT_INTERVAL == 0:
+            self.save_checkpoint()
+
+    def _restore_from_checkpoint(self):
+        """Carrega o checkpoint válido mais recente e reprocessa só os blocos posteriores a ele."""
+        for height in self.checkpoints.heights():
+            checkpoint = self.checkpoints.load(height)
+            if (checkpoint and height <= len(self.chain)
+                    and checkpoint.get('block_hash') == self.get_block_hash(height)
+                    and set(checkpoint.get('state', {})) == set(self._empty_state())):
+                self.state = checkpoint['state']
+                self._undo_journals = {}
+                for block in self.chain[height:]:
+                    self._process_block(block)
+                print(f"[Checkpoint] Estado restaurado da altura {height}; {len(self.chain) - height} blocos reprocessados.")
+                return True
+            print(f"[Checkpoint] Checkpoint da altura {height} não confere com a cadeia. Descartado.")
+            self.checkpoints.discard(height)
+        return False
+
+    def _migrate_legacy_chain_file(self):
+        """Importa o antigo blockchain_<porta>.json para o log de blocos (executa uma única vez)."""
+        try:
+            with open(self.chain_file, 'r') as f: legacy_chain = json.load(f)
+        except json.JSONDecodeError:
+            return
+        self.store.extend(legacy_chain)
+        os.replace(self.chain_file, self.chain_file + '.migrated')
+        print(f"[Storage] {len(legacy_chain)} blocos migrados de {self.chain_file}.")
 
     def create_block(self, proof, previous_hash):
         block = {
             'index': len(self.chain) + 1, 'timestamp': time.time(),
-            'transactions': self.pending_transactions, 'proof': proof,
-            'previous_hash': previous_hash or self.hash(self.chain[-1]),
+            'transactions': [], 'proof': proof,
+            'previous_hash': previous_hash or self.get_block_hash(len(self.chain)),
         }
-        for tx in self.pending_transactions:
-            self._process_transaction_for_state_update(tx)
-        self.pending_transactions = []
+        # Aplica somente as transações pendentes; uma transação que falhe é desfeita
+        # e fica de fora do bloco, sem afetar as demais.
+        included = []
+        journal = self._journal = []
+        try:
+            for encoded in self.mempool.encoded():
+                if encoded.transaction['sender'] != "0" and encoded.hash in self.state['tx_locations']:
+                    # Já minerada (mempool desatualizado): repeti-la aplicaria a mesma transação assinada duas vezes
+                    print(f"[Create Block] Transação {encoded.hash[:16]}... já está na cadeia. Descartada.")
+                    continue
+                mark = len(self._journal)
+                try:
+                    self._index_transaction(encoded.hash, block['index'], len(block['transactions']))
+                    self._process_transaction_for_state_update(encoded.tx_data, block['index'], len(block['transactions']), encoded.hash)
+                    block['transactions'].append(encoded.tx_data)
+                    included.append(encoded)
+                except Exception as e:
+                    self._rollback(self._journal, mark)
+                    print(f"[Create Block] Transação descartada ao montar o bloco #{block['index']}: {e}")
+        finally:
+            self._journal = None
+        self._keep_undo_journal(block['index'], journal)
+        self.mempool.clear()
         self.chain.append(block)
+        self._block_hashes[block['index']] = hash_block(block, included) # Reaproveita as transações já serializadas
         self.save_chain()
-        # Garante que sets estejam corretos após processar transações do bloco
-        self.state['authorized_notaries'] = set(self.state.get('authorized_notaries', []))
-        self.state['certified_identities'] = set(self.state.get('certified_identities', []))
+        self._maybe_checkpoint()
         return block
 
-    def add_block(self, block):
+    def add_block(self, block, signatures_verified=False):
         if not self.chain: # Se a cadeia local estiver vazia, aceita o bloco gênesis
              if block['index'] == 1:
+                 encoded_transactions = encode_transactions(block)
+                 if not (signatures_verified or self.are_signatures_valid([block], encoded_transactions)):
+                     return False
+                 if not self._apply_block(block, encoded_transactions):
+                     return False
                  self.chain.append(block)
+                 self._block_hashes[1] = hash_block(block, encoded_transactions)
                  self.save_chain()
-                 self.rebuild_state_from_chain()
-                 self.state['authorized_notaries'] = set(self.state.get('authorized_notaries', []))
-                 self.state['certified_identities'] = set(self.state.get('certified_identities', []))
                  print("[Add Block] Bloco Gênesis aceito.")
                  return True
              else:
@@ -271,33 +543,34 @@ class Blockchain:
                  return False
 
         last_block = self.last_block
-        if (block['previous_hash'] != self.hash(last_block) or
+        last_hash = self.get_block_hash(last_block['index'])
+        if (block['previous_hash'] != last_hash or
             block['index'] != last_block['index'] + 1 or
             not self.valid_proof(last_block['proof'], block['proof'])):
             print(f"[Add Block] Bloco #{block.get('index')} rejeitado. Validação falhou.")
-            print(f"  Hash anterior esperado: {self.hash(last_block)}")
+            print(f"  Hash anterior esperado: {last_hash}")
             print(f"  Hash anterior recebido: {block['previous_hash']}")
             print(f"  Índice esperado: {last_block['index'] + 1}")
             print(f"  Índice recebido: {block['index']}")
             return False
         
-        # Se a validação básica passar, reconstrói o estado
-        temp_chain = self.chain + [block]
-        
-        # NOTA: is_chain_valid não é robusto o suficiente aqui,
-        # vamos confiar na reconstrução do estado e no add_transaction
-        
-        self.chain = temp_chain
-        self.rebuild_state_from_chain()
-        self.state['authorized_notaries'] = set(self.state.get('authorized_notaries', []))
-        self.state['certified_identities'] = set(self.state.get('certified_identities', []))
-
-        received_tx_ids = {json.dumps(tx['transaction'], sort_keys=True) for tx in block.get('transactions', [])}
-        self.pending_transactions = [
-            ptx for ptx in self.pending_transactions
-            if json.dumps(ptx['transaction'], sort_keys=True) not in received_tx_ids
-        ]
+        # Cada transação é serializada uma única vez para assinatura, estado, mempool e hash do bloco
+        encoded_transactions = encode_transactions(block)
+        if not (signatures_verified or self.are_signatures_valid([block], encoded_transactions)):
+            print(f"[Add Block] Bloco #{block.get('index')} rejeitado. Assinatura inválida.")
+            return False
+
+        # Se a validação básica passar, aplica apenas as transações do novo bloco.
+        # Em caso de falha o estado é revertido e a cadeia local não é alterada.
+        if not self._apply_block(block, encoded_transactions):
+            print(f"[Add Block] Bloco #{block.get('index')} rejeitado. Falha ao aplicar transações.")
+            return False
+        self.chain.append(block)
+        self._block_hashes[block['index']] = hash_block(block, encoded_transactions)
+
+        self.mempool.remove_many(encoded.hash for encoded in encoded_transactions)
         self.save_chain()
+        self._maybe_checkpoint()
         print(f"[Add Block] Bloco #{block.get('index')} aceito.")
         return True
 
@@ -315,10 +588,18 @@ class Blockchain:
         transaction = {'sender': sender_address, 'recipient': recipient_address, 'data': data}
         
         if sender_address == "0":
-            self.pending_transactions.append({'transaction': transaction, 'signature': 'reward'})
+            if self.mempool.add(EncodedTransaction({'transaction': transaction, 'signature': 'reward'})) is None:
+                print("[Add TX Error] Transação do sistema já está na fila de pendentes.")
+                return False
             return self.last_block['index'] + 1
         
-        if Wallet.verify_transaction(sender_address, transaction, signature):
+        encoded = EncodedTransaction({'transaction': transaction, 'signature': signature})
+        if encoded.hash in self.state['tx_locations']:
+            # Reenvio (ou cópia atrasada recebida por gossip) de uma transação já minerada
+            print("[Add TX Error] Transação já incluída na cadeia.")
+            return False
+
+        if Wallet.verify_transaction(sender_address, encoded, signature):
             tx_type = transaction['data'].get('type')
 
             if tx_type == 'MINT_TOKEN' and sender_address not in self.state['authorized_notaries']:
@@ -353,12 +634,27 @@ class Blockchain:
                     print(f"[Add TX Error] Falha na APROVAÇÃO/REJEIÇÃO: Cartório {sender_address[:10]} ({notary_locality}) não é da localidade da requisição ({request.get('locality')}).")
                     return False
 
-            self.pending_transactions.append({'transaction': transaction, 'signature': signature})
+            if self.mempool.add(encoded) is None:
+                print("[Add TX Error] Transação já está na fila de pendentes.")
+                return False
             return self.last_block['index'] + 1
 
         print("[Add TX Error] Verificação de assinatura falhou.")
         return False
 
+    def get_block_hash(self, block_index):
+        """Hash do bloco local de índice 'block_index' (começando em 1). Cada bloco é serializado uma única vez."""
+        block_hash = self._block_hashes.get(block_index)
+        if block_hash is None:
+            block_hash = self.hash(self.chain[block_index - 1])
+            self._block_hashes[block_index] = block_hash
+        return block_hash
+
+    def _invalidate_block_hashes(self, fork_height):
+        """Descarta do cache os hashes dos blocos acima de 'fork_height' (reorganização da cadeia)."""
+        for block_index in [i for i in self._block_hashes if i > fork_height]:
+            del self._block_hashes[block_index]
+
     @staticmethod
     def hash(block):
         # Garante que o bloco gênesis tenha um hash consistente se previous_hash for None
@@ -368,7 +664,7 @@ class Blockchain:
 
     @staticmethod
     def hash_transaction(transaction):
-        return hashlib.sha256(json.dumps(transaction, sort_keys=True).encode()).hexdigest()
+        return EncodedTransaction({'transaction': transaction}).hash
 
     def proof_of_work(self, last_proof):
         proof = 0
@@ -377,34 +673,336 @@ class Blockchain:
 
     @staticmethod
     def valid_proof(last_proof, proof):
-        guess_hash = hashlib.sha256(f'{last_proof}{proof}'.encode()).hexdigest()
-        return guess_hash[:4] == "0000"
+        # Compara os bytes do digest: "0000" em hexadecimal equivale aos 2 primeiros bytes nulos
+        return hashlib.sha256(f'{last_proof}{proof}'.encode()).digest()[:2] == b'\x00\x00'
     
     def add_node(self, address):
-        self.nodes.add(address)
+        return self.peers.add(address)
+
+    def remove_node(self, address):
+        return self.peers.remove(address)
 
     def resolve_conflicts(self):
-        neighbours = self.nodes
-        new_chain, max_length = None, len(self.chain)
-        for node in neighbours:
-            try:
-                response = requests.get(f'http://{node}/chain', timeout=2)
-                if response.status_code == 200:
-                    length, chain = response.json()['length'], response.json()['chain']
-                    if length > max_length and self.is_chain_valid(chain):
-                        max_length, new_chain = length, chain
-            except requests.exceptions.RequestException: continue
-        if new_chain:
-            self.chain = new_chain
-            self.save_chain()
-            self.rebuild_state_from_chain()
-            self.state['authorized_notaries'] = set(self.state.get('authorized_notaries', []))
-            self.state['certified_identities'] = set(self.state.get('certified_identities', []))
+        """Sincroniza com a rede: busca o candidato (rede) e o aplica (estado) em sequência."""
+        return self.apply_sync_candidate(self.fetch_sync_candidate())
+
+    def sync_snapshot(self):
+        """Cópia da cadeia local (blocos e hashes) para a fase de rede da sincronização.
+
+        Deve ser tirada com o chain_lock: só quem o detém preenche o cache de hashes, e a fase de rede
+        roda sem ele (a cadeia pode ser reorganizada no meio).
+        """
+        return {'chain': list(self.chain), 'hashes': [self.get_block_hash(i) for i in range(1, len(self.chain) + 1)]}
+
+    def fetch_sync_candidate(self, deadline=SYNC_DEADLINE, nodes=None, snapshot=None):
+        """Fase de rede da sincronização headers-first; não altera a cadeia e não precisa do chain_lock.
+
+        Todos os vizinhos são consultados em paralelo (um /headers a partir da ponta local).
+        Assim que chega uma ponta maior que a melhor conhecida, o download dos cabeçalhos e
+        blocos faltantes dessa ponta começa no mesmo pool. A rodada inteira respeita um único
+        prazo: quem não respondeu até lá é ignorado, e downloads em andamento entregam o prefixo
+        já verificado. Cada download vai no máximo até MAX_BLOCKS_PER_SYNC_ROUND blocos (ou
+        MAX_SIGNATURES_PER_SYNC_ROUND assinaturas); o candidato traz 'partial' se o vizinho tiver mais.
+        Vizinhos antigos, sem /headers, são sincronizados pelo /chain completo.
+        'nodes' restringe a rodada a esses vizinhos (ex.: o nó que acabou de anunciar uma ponta nova).
+        'snapshot' (sync_snapshot(), tirado com o chain_lock) é a visão local usada em toda a rodada.
+        """
+        if nodes is None:
+            nodes = self.peers.available() # Sem os nós em espera; os mais rápidos primeiro
+        if not nodes: return None
+        local = snapshot if snapshot is not None else self.sync_snapshot()
+        local_height = len(local['hashes'])
+        deadline_at = time.time() + deadline
+        pool = ThreadPoolExecutor(max_workers=min(len(nodes), MAX_SYNC_WORKERS))
+        pending = {pool.submit(self._poll_peer_tip, node, local_height): ('tip', node) for node in nodes}
+        best, best_tip = None, local_height
+        try:
+            while pending:
+                now = time.time()
+                if now >= deadline_at:
+                    # Quem não respondeu no prazo é ignorado; downloads já iniciados ganham mais SYNC_TIMEOUT
+                    late = [node for kind, node in pending.values() if kind == 'tip']
+                    if late:
+                        print(f"[Sync] Prazo de {deadline}s esgotado; {len(late)} consultas sem resposta ignoradas.")
+                        for node in late:
+                            self.peers.record_failure(node)
+                    pending = {f: info for f, info in pending.items() if info[0] == 'candidate'}
+                    if not pending: break
+                remaining = (deadline_at if now < deadline_at else deadline_at + SYNC_TIMEOUT) - now
+                done, _ = wait(pending, timeout=max(remaining, 0), return_when=FIRST_COMPLETED)
+                if not done and now >= deadline_at:
+                    # Um download ainda em andamento (ex.: verificando assinaturas) não é falha do vizinho
+                    print(f"[Sync] {len(pending)} downloads não terminaram a tempo; ficam para a próxima rodada.")
+                    break
+                for future in done:
+                    kind, node = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as e:
+                        print(f"[Sync] Falha ao consultar {node}: {e}")
+                        self.peers.record_failure(node)
+                        continue
+                    if kind == 'tip':
+                        if result is None:
+                            pending[pool.submit(self._download_full_chain, node, local)] = ('candidate', node)
+                        elif result[0] > best_tip and time.time() < deadline_at:
+                            best_tip = result[0]
+                            pending[pool.submit(self._download_candidate, node, result[1], local, deadline_at)] = ('candidate', node)
+                    elif result and (best is None or result['length'] > best['length']):
+                        best = result
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+        return best
+
+    def apply_sync_candidate(self, candidate):
+        """Fase de estado da sincronização: adota o candidato se ele ainda for maior que a cadeia local.
+
+        Deve ser chamada com o chain_lock; a cadeia pode ter crescido desde a fase de rede.
+        """
+        if not candidate: return False
+        fork_height = candidate['fork_height']
+        if candidate['length'] <= len(self.chain) or fork_height > len(self.chain): return False
+        if fork_height and self.get_block_hash(fork_height) != candidate['fork_hash']: return False
+
+        if fork_height == len(self.chain):
+            # Extensão simples da cadeia local: aplica bloco a bloco, sem reprocessar o estado
+            applied = False
+            for block, block_hash in zip(candidate['blocks'], candidate['hashes']):
+                if not self.add_block(block, signatures_verified=True): break
+                self._block_hashes[block['index']] = block_hash
+                applied = True
+            return applied
+
+        return self._reorganize(fork_height, candidate['blocks'], candidate['hashes'])
+
+    def _reorganize(self, fork_height, blocks, hashes):
+        """Troca os blocos locais acima de 'fork_height' (ancestral comum) pelo ramo 'blocks', já validado.
+
+        Só o estado dos blocos órfãos é desfeito (pelos journals) e só o novo ramo é aplicado: o custo é
+        proporcional à profundidade do fork, não ao tamanho da cadeia. As transações órfãs que não estão
+        no novo ramo voltam ao mempool. Sem journals até o ancestral (fork mais fundo que UNDO_DEPTH ou
+        nó recém-iniciado), o estado vem do último checkpoint anterior ao fork.
+        """
+        start = time.time()
+        if not all(i in self._undo_journals for i in range(fork_height + 1, len(self.chain) + 1)):
+            orphaned = self.chain[fork_height:]
+            local_hashes = [self.get_block_hash(i) for i in range(1, fork_height + 1)]
+            self._adopt_chain(self.chain[:fork_height] + blocks, local_hashes + hashes, fork_height)
+            self.mempool.remove_many(encoded.hash for block in blocks for encoded in encode_transactions(block))
+            self._requeue_orphaned(orphaned)
             return True
-        return False
-        
-    def is_chain_valid(self, chain):
+
+        orphaned = self._rewind(fork_height)
+        applied = []
+        for block, block_hash in zip(blocks, hashes):
+            encoded_transactions = encode_transactions(block)
+            if not self._apply_block(block, encoded_transactions): break
+            self.chain.append(block)
+            self._block_hashes[block['index']] = block_hash
+            applied.extend(encoded_transactions)
+        if len(self.chain) <= fork_height + len(orphaned):
+            # O novo ramo não passou do local: volta ao ramo original, também só pelos journals
+            print(f"[Reorg] Ramo novo inválido a partir do bloco #{len(self.chain) + 1}. Ramo local restaurado.")
+            self._rewind(fork_height)
+            for block in orphaned:
+                self._apply_block(block)
+                self.chain.append(block)
+            return False
+
+        self.mempool.remove_many(encoded.hash for encoded in applied)
+        self.save_chain(fork_height)
+        self.checkpoints.discard_above(fork_height)
+        self._maybe_checkpoint()
+        requeued = self._requeue_orphaned(orphaned)
+        print(f"[Reorg] Ancestral comum na altura {fork_height}: {len(orphaned)} blocos desfeitos, "
+              f"{len(self.chain) - fork_height} aplicados, {requeued} transações de volta ao mempool "
+              f"em {time.time() - start:.3f}s.")
+        return True
+
+    def _requeue_orphaned(self, orphaned_blocks):
+        """Devolve ao mempool as transações dos blocos órfãos que não entraram na cadeia adotada."""
+        orphaned = [encoded for block in orphaned_blocks for encoded in encode_transactions(block)
+                    if encoded.transaction['data'].get('type') != 'MINING_REWARD' # Recriada por quem minerar
+                    and encoded.hash not in self.state['tx_locations']]
+        return self.mempool.requeue(orphaned)
+
+    def _poll_peer_tip(self, node, local_height):
+        """Retorna (tamanho da cadeia, cabeçalhos a partir da ponta local) ou None se o nó não tiver /headers."""
+        start = time.time()
+        response = requests.get(f'http://{node}/headers', params={'from': local_height}, headers=SYNC_HEADERS, timeout=SYNC_TIMEOUT)
+        self.peers.record_success(node, time.time() - start) # Qualquer resposta HTTP: o nó está no ar
+        if response.status_code == 404: return None
+        response.raise_for_status()
+        body = codec.decode_response(response)
+        return body['length'], body['headers']
+
+    def _download_candidate(self, node, headers, local, deadline_at):
+        """Baixa do vizinho os cabeçalhos e blocos após o ancestral comum, até o teto de uma rodada.
+
+        Se o prazo ou o teto acabarem no meio do caminho, devolve o prefixo já verificado.
+        """
+        local_hashes = local['hashes']
+        fork_height = self._find_fork_height(node, len(local_hashes), headers, local_hashes)
+        print(f"[Sync] {node}: ancestral comum na altura {fork_height} (local: {len(local_hashes)}).")
+        # Num fork mais fundo que o teto, o candidato ainda precisa passar da cadeia local para ser adotado
+        needed = len(local_hashes) - fork_height + 1
+        max_blocks = max(MAX_BLOCKS_PER_SYNC_ROUND, needed)
+
+        # 1) Cabeçalhos faltantes: valida encadeamento e PoW antes de baixar qualquer bloco
+        new_headers, remote_length = [], 0
+        while len(new_headers) < max_blocks and time.time() < deadline_at:
+            response = requests.get(f'http://{node}/headers', params={'from': fork_height + len(new_headers) + 1}, headers=SYNC_HEADERS, timeout=SYNC_TIMEOUT)
+            response.raise_for_status()
+            body = codec.decode_response(response)
+            page, remote_length = body['headers'], body['length']
+            new_headers.extend(page)
+            if not page or new_headers[-1]['index'] >= remote_length: break
+        new_headers = new_headers[:max_blocks]
+        if not new_headers or not self._are_headers_valid(new_headers, fork_height, local): return None
+
+        # 2) Blocos faltantes, em faixas; cada bloco precisa bater com o hash do seu cabeçalho
+        new_blocks, new_encoded, signatures = [], [], 0
+        while len(new_blocks) < len(new_headers) and time.time() < deadline_at:
+            first = fork_height + len(new_blocks) + 1
+            response = requests.get(f'http://{node}/blocks', params={'from': first, 'to': new_headers[-1]['index']}, headers=SYNC_HEADERS, timeout=SYNC_TIMEOUT)
+            response.raise_for_status()
+            page = codec.decode_response(response)['blocks']
+            if not page: break
+            for block in page[:len(new_headers) - len(new_blocks)]:
+                header = new_headers[len(new_blocks)]
+                encoded_transactions = encode_transactions(block)
+                if block.get('index') != header['index'] or hash_block(block, encoded_transactions) != header['hash']:
+                    print(f"[Sync] Bloco #{block.get('index')} de {node} não confere com o cabeçalho.")
+                    return None
+                signatures += sum(1 for encoded in encoded_transactions if encoded.transaction['sender'] != "0")
+                if len(new_blocks) >= needed and signatures > MAX_SIGNATURES_PER_SYNC_ROUND:
+                    del new_headers[len(new_blocks):] # O resto fica para a próxima rodada
+                    break
+                new_blocks.append(block)
+                new_encoded.extend(encoded_transactions)
+        if not new_blocks or not self.are_signatures_valid(new_blocks, new_encoded): return None
+
+        return {
+            'node': node,
+            'length': fork_height + len(new_blocks),
+            'partial': remote_length > fork_height + len(new_blocks),
+            'fork_height': fork_height,
+            'fork_hash': local_hashes[fork_height - 1] if fork_height else None,
+            'blocks': new_blocks,
+            'hashes': [header['hash'] for header in new_headers[:len(new_blocks)]]
+        }
+
+    def are_signatures_valid(self, blocks, encoded_transactions=None):
+        """Verifica a assinatura de toda transação não-recompensa dos blocos; para na primeira inválida.
+
+        'encoded_transactions' (EncodedTransaction de todos os blocos, em ordem) evita reserializar as transações.
+        """
+        if encoded_transactions is None:
+            transactions = signed_transactions(blocks)
+        else:
+            transactions = [encoded for encoded in encoded_transactions if encoded.transaction['sender'] != "0"]
+        if not transactions: return True
+        if self.signature_verifier is not None:
+            invalid = self.signature_verifier.find_invalid(transactions)
+        else:
+            invalid = find_invalid_signature(transactions)
+        if invalid is not None:
+            sender = (invalid.transaction if encoded_transactions is not None else invalid['transaction'])['sender']
+            print(f"[Verify] Assinatura inválida na transação de {sender[:30]}... Bloco(s) rejeitado(s).")
+            return False
+        return True
+
+    def _find_fork_height(self, node, start, headers, local_hashes):
+        """Maior altura em que as cadeias local e do vizinho coincidem (recuando exponencialmente)."""
+        step = 1
+        while True:
+            matches = [h['index'] for h in headers
+                       if 1 <= h['index'] <= len(local_hashes) and h['hash'] == local_hashes[h['index'] - 1]]
+            if matches: return max(matches)
+            if start <= 1: return 0
+            start, step = max(1, start - step), step * 2
+            response = requests.get(f'http://{node}/headers', params={'from': start}, headers=SYNC_HEADERS, timeout=SYNC_TIMEOUT)
+            if response.status_code != 200: return 0
+            headers = codec.decode_response(response)['headers']
+
+    def _are_headers_valid(self, headers, fork_height, local):
+        if fork_height == 0:
+            first = headers[0]
+            if first['index'] != 1 or first['previous_hash'] != '0' or first['proof'] != 100:
+                print("[Sync] Cabeçalho gênesis inválido.")
+                return False
+            previous_hash, previous_proof, headers = first['hash'], first['proof'], headers[1:]
+            expected_index = 2
+        else:
+            previous_hash = local['hashes'][fork_height - 1]
+            previous_proof = local['chain'][fork_height - 1]['proof']
+            expected_index = fork_height + 1
+        for header in headers:
+            if (header['index'] != expected_index or header['previous_hash'] != previous_hash or
+                    not self.valid_proof(previous_proof, header['proof'])):
+                print(f"[Sync] Cabeçalho #{header.get('index')} inválido.")
+                return False
+            previous_hash, previous_proof, expected_index = header['hash'], header['proof'], expected_index + 1
+        return True
+
+    def _download_full_chain(self, node, local):
+        """Modo antigo: baixa o /chain completo do nó e o valida desde o gênesis.
+
+        Só os MAX_BLOCKS_PER_SYNC_ROUND blocos após o ancestral comum (ou os necessários para passar da
+        cadeia local) têm as assinaturas verificadas e entram no candidato.
+        """
+        response = requests.get(f'http://{node}/chain', headers=SYNC_HEADERS, timeout=SYNC_TIMEOUT)
+        response.raise_for_status()
+        body = codec.decode_response(response)
+        length, chain = body['length'], body['chain']
+        chain_hashes, local_hashes = [], local['hashes']
+        if length <= len(local_hashes) or not self.is_chain_valid(chain, chain_hashes): return None
+        fork_height = 0
+        for block_index, remote_hash in enumerate(chain_hashes[:len(local_hashes)], start=1):
+            if local_hashes[block_index - 1] != remote_hash: break
+            fork_height = block_index
+        end = fork_height + max(MAX_BLOCKS_PER_SYNC_ROUND, len(local_hashes) - fork_height + 1)
+        if not self.are_signatures_valid(chain[fork_height:end]): return None
+        return {
+            'node': node,
+            'length': min(length, end),
+            'partial': length > end,
+            'fork_height': fork_height,
+            'fork_hash': chain_hashes[fork_height - 1] if fork_height else None,
+            'blocks': chain[fork_height:end],
+            'hashes': chain_hashes[fork_height:end]
+        }
+
+    def _adopt_chain(self, new_chain, new_hashes, fork_height):
+        """Substitui a cadeia local por 'new_chain' (já validada), que coincide com a local até 'fork_height'."""
+        self.chain = new_chain
+        self._invalidate_block_hashes(fork_height)
+        self._block_hashes.update(enumerate(new_hashes, start=1)) # Já calculados na validação
+        self.save_chain(fork_height)
+        self.checkpoints.discard_above(fork_height)
+        if self.reindex_on_load or not self._restore_from_checkpoint():
+            self.reindex()
+
+    def get_headers(self, start, limit=MAX_HEADERS_PER_REQUEST):
+        """Cabeçalhos (índice, hash, hash anterior e prova) a partir do bloco 'start'."""
+        start = max(start, 1)
+        return [{
+            'index': block['index'],
+            'hash': self.get_block_hash(block['index']),
+            'previous_hash': block['previous_hash'],
+            'proof': block['proof']
+        } for block in self.chain[start - 1:start - 1 + limit]]
+
+    def get_blocks(self, start, end, limit=MAX_BLOCKS_PER_REQUEST):
+        """Blocos de 'start' a 'end' (inclusive), limitados a 'limit' por pedido."""
+        start = max(start, 1)
+        end = min(end, start + limit - 1)
+        return self.chain[start - 1:end]
+
+    def is_chain_valid(self, chain, hashes=None):
+        """Valida encadeamento e PoW. Se 'hashes' for uma lista, recebe o hash de cada bloco validado."""
         if not chain: return False
+        if hashes is None: hashes = []
         
         # Valida Bloco Gênesis
         if chain[0]['index'] != 1 or chain[0]['previous_hash'] != '0' or chain[0]['proof'] != 100:
@@ -412,133 +1010,113 @@ class Blockchain:
             return False
             
         last_block, current_index = chain[0], 1
+        hashes.append(self.hash(last_block))
         
         while current_index < len(chain):
             block = chain[current_index]
-            if block['previous_hash'] != self.hash(last_block) or \
+            if block['previous_hash'] != hashes[-1] or \
                not self.valid_proof(last_block['proof'], block['proof']) or \
                block['index'] != last_block['index'] + 1:
                 print(f"[Is Chain Valid] Validação falhou no bloco {block['index']}")
                 return False
+            hashes.append(self.hash(block))
             last_block, current_index = block, current_index + 1
         return True
 
+    def get_token_events(self, token_id):
+        """Eventos do ativo em ordem cronológica, lidos direto do índice (custo proporcional aos eventos do token)."""
+        events = []
+        for block_index, tx_position, event_type in self.state['token_events'].get(token_id, []):
+            block = self.chain[block_index - 1]
+            events.append({
+                'block_index': block_index,
+                'tx_position': tx_position,
+                'type': event_type,
+                'timestamp': block['timestamp'],
+                'transaction': block['transactions'][tx_position]['transaction']
+            })
+        return events
+
     def get_token_history(self, token_id):
         history = []
         separator = "=" * 60
-        for block in self.chain:
-            for tx_data in block['transactions']:
-                tx = tx_data['transaction']
-                tx_type = tx['data'].get('type')
-                payload = tx['data'].get('payload', {})
-                current_tx_token_id = None
-                if tx_type == 'MINT_TOKEN':
-                    current_tx_token_id = payload.get('token_id')
-                elif tx_type == 'REQUEST_SALE_APPROVAL':
-                    current_tx_token_id = payload.get('token_id')
-                elif tx_type in ['APPROVE_SALE', 'REJECT_SALE']:
-                    request_id = payload.get('request_id')
-                    request = self._find_request_in_history(request_id)
-                    if request: current_tx_token_id = request.get('token_id')
-                elif tx_type == 'EXECUTE_SALE_CONTRACT':
-                    contract_id = payload.get('contract_id')
-                    original_contract = self._find_contract_in_history(contract_id)
-                    if original_contract: current_tx_token_id = original_contract.get('token_id')
-
-                if current_tx_token_id == token_id:
-                    tx_hash = self.hash_transaction(tx)
-                    timestamp = time.strftime('%d/%m/%Y %H:%M:%S', time.localtime(block['timestamp']))
-                    card = [separator]
-                    if tx_type == 'MINT_TOKEN':
-                        owner_hash = hashlib.sha256(tx['recipient'].encode()).hexdigest()[:16]
-                        notary_hash = hashlib.sha256(tx['sender'].encode()).hexdigest()[:16]
-                        card.append(f"EVENTO:         REGISTRO (MINT) EM {payload.get('locality')}")
-                        card.append(f"TIMESTAMP:      {timestamp} (Bloco #{block['index']})")
-                        card.append(f"  - Ativo (Token ID): {token_id}")
-                        card.append(f"  - Dono Inicial:     {owner_hash}")
-                        card.append(f"  - Cartório (Emissor): {notary_hash}")
-                        card.append(f"  - Hash Detalhes:    {payload.get('details_hash', 'N/A')[:16]}...")
-                    elif tx_type == 'REQUEST_SALE_APPROVAL':
-                        seller_hash = hashlib.sha256(tx['sender'].encode()).hexdigest()[:16]
-                        card.append(f"EVENTO:         SOLICITAÇÃO DE VENDA")
-                        card.append(f"TIMESTAMP:      {timestamp} (Bloco #{block['index']})")
-                        card.append(f"  - Vendedor:         {seller_hash}")
-                        card.append(f"  - Preço Sugerido:   {payload.get('price')} moedas")
-                    elif tx_type == 'APPROVE_SALE':
-                        notary_hash = hashlib.sha256(tx['sender'].encode()).hexdigest()[:16]
-                        card.append(f"EVENTO:         VENDA APROVADA (CONTRATO CRIADO)")
-                        card.append(f"TIMESTAMP:      {timestamp} (Bloco #{block['index']})")
-                        card.append(f"  - Cartório:         {notary_hash}")
-                        card.append(f"  - Contrato ID:      {payload.get('contract_id', 'N/A')[:16]}...")
-                    elif tx_type == 'REJECT_SALE':
-                        notary_hash = hashlib.sha256(tx['sender'].encode()).hexdigest()[:16]
-                        card.append(f"EVENTO:         VENDA REJEITADA")
-                        card.append(f"TIMESTAMP:      {timestamp} (Bloco #{block['index']})")
-                        card.append(f"  - Cartório:         {notary_hash}")
-                        card.append(f"  - Motivo:           {payload.get('reason', 'N/A')}")
-                    elif tx_type == 'EXECUTE_SALE_CONTRACT':
-                        original_contract = self._find_contract_in_history(payload.get('contract_id'))
-                        if original_contract:
-                            seller_hash = hashlib.sha256(original_contract['seller'].encode()).hexdigest()[:16]
-                            buyer_hash = hashlib.sha256(tx['sender'].encode()).hexdigest()[:16]
-                            price = original_contract['price']
-                            tax = int(price * TAX_RATE)
-                            card.append(f"EVENTO:         TRANSFERÊNCIA (VENDA CONCLUÍDA)")
-                            card.append(f"TIMESTAMP:      {timestamp} (Bloco #{block['index']})")
-                            card.append(f"  - De (Vendedor):    {seller_hash}")
-                            card.append(f"  - Para (Comprador): {buyer_hash}")
-                            card.append(f"  - Valor:            {price} moedas")
-                            card.append(f"  - Imposto (ITBI):   {tax} moedas")
-                    card.append(separator)
-                    history.append("\n".join(card))
+        for event in self.get_token_events(token_id):
+            tx = event['transaction']
+            tx_type = event['type']
+            payload = tx['data'].get('payload', {})
+            block_index = event['block_index']
+            timestamp = time.strftime('%d/%m/%Y %H:%M:%S', time.localtime(event['timestamp']))
+            card = [separator]
+            if tx_type == 'MINT_TOKEN':
+                owner_hash = hashlib.sha256(tx['recipient'].encode()).hexdigest()[:16]
+                notary_hash = hashlib.sha256(tx['sender'].encode()).hexdigest()[:16]
+                card.append(f"EVENTO:         REGISTRO (MINT) EM {payload.get('locality')}")
+                card.append(f"TIMESTAMP:      {timestamp} (Bloco #{block_index})")
+                card.append(f"  - Ativo (Token ID): {token_id}")
+                card.append(f"  - Dono Inicial:     {owner_hash}")
+                card.append(f"  - Cartório (Emissor): {notary_hash}")
+                card.append(f"  - Hash Detalhes:    {payload.get('details_hash', 'N/A')[:16]}...")
+            elif tx_type == 'REQUEST_SALE_APPROVAL':
+                seller_hash = hashlib.sha256(tx['sender'].encode()).hexdigest()[:16]
+                card.append(f"EVENTO:         SOLICITAÇÃO DE VENDA")
+                card.append(f"TIMESTAMP:      {timestamp} (Bloco #{block_index})")
+                card.append(f"  - Vendedor:         {seller_hash}")
+                card.append(f"  - Preço Sugerido:   {payload.get('price')} moedas")
+            elif tx_type == 'APPROVE_SALE':
+                notary_hash = hashlib.sha256(tx['sender'].encode()).hexdigest()[:16]
+                card.append(f"EVENTO:         VENDA APROVADA (CONTRATO CRIADO)")
+                card.append(f"TIMESTAMP:      {timestamp} (Bloco #{block_index})")
+                card.append(f"  - Cartório:         {notary_hash}")
+                card.append(f"  - Contrato ID:      {payload.get('contract_id', 'N/A')[:16]}...")
+            elif tx_type == 'REJECT_SALE':
+                notary_hash = hashlib.sha256(tx['sender'].encode()).hexdigest()[:16]
+                card.append(f"EVENTO:         VENDA REJEITADA")
+                card.append(f"TIMESTAMP:      {timestamp} (Bloco #{block_index})")
+                card.append(f"  - Cartório:         {notary_hash}")
+                card.append(f"  - Motivo:           {payload.get('reason', 'N/A')}")
+            elif tx_type == 'EXECUTE_SALE_CONTRACT':
+                # Contratos nunca saem do estado, então o contrato original está sempre disponível
+                original_contract = self.state['contracts'].get(payload.get('contract_id'))
+                if original_contract:
+                    seller_hash = hashlib.sha256(original_contract['seller'].encode()).hexdigest()[:16]
+                    buyer_hash = hashlib.sha256(tx['sender'].encode()).hexdigest()[:16]
+                    price = original_contract['price']
+                    tax = int(price * TAX_RATE)
+                    card.append(f"EVENTO:         TRANSFERÊNCIA (VENDA CONCLUÍDA)")
+                    card.append(f"TIMESTAMP:      {timestamp} (Bloco #{block_index})")
+                    card.append(f"  - De (Vendedor):    {seller_hash}")
+                    card.append(f"  - Para (Comprador): {buyer_hash}")
+                    card.append(f"  - Valor:            {price} moedas")
+                    card.append(f"  - Imposto (ITBI):   {tax} moedas")
+            card.append(separator)
+            history.append("\n".join(card))
         return history
 
-    def _find_contract_in_history(self, contract_id):
-        if contract_id in self.state['contracts']:
-            return self.state['contracts'][contract_id]
-        for block in reversed(self.chain):
-            for tx_data in block['transactions']:
-                tx = tx_data['transaction']
-                if tx['data'].get('type') == 'APPROVE_SALE':
-                    payload = tx['data'].get('payload', {})
-                    if payload.get('contract_id') == contract_id:
-                        request_id = payload.get('original_request_id')
-                        request = self._find_request_in_history(request_id)
-                        if request:
-                             return {
-                                'token_id': request['token_id'],
-                                'seller': request['seller'],
-                                'price': request['price'],
-                                'status': 'CLOSED',
-                                'approved_by': tx['sender'],
-                            }
-        return None
-
-    def _find_request_in_history(self, request_id):
-        if request_id in self.state['pending_sale_requests']:
-             return self.state['pending_sale_requests'][request_id]
-        for block in reversed(self.chain):
-             for tx_data in block['transactions']:
-                 tx = tx_data['transaction']
-                 if tx['data'].get('type') == 'REQUEST_SALE_APPROVAL':
-                     payload = tx['data'].get('payload', {})
-                     if payload.get('request_id') == request_id:
-                         token_metadata = self.get_token_metadata(payload['token_id'])
-                         return {
-                             'token_id': payload['token_id'],
-                             'seller': tx['sender'],
-                             'price': payload['price'],
-                             'status': 'PROCESSED',
-                             'locality': token_metadata.get('locality', 'N/A')
-                         }
-        return None
+    def get_transaction(self, tx_hash):
+        """Transação pelo hash, com bloco, posição e confirmações; None se não estiver na cadeia."""
+        location = self.state['tx_locations'].get(tx_hash)
+        if location is None:
+            return None
+        block_index, position = location
+        return {
+            'tx_hash': tx_hash,
+            'transaction': self.chain[block_index - 1]['transactions'][position],
+            'block_index': block_index,
+            'block_hash': self.get_block_hash(block_index),
+            'position': position,
+            'confirmations': len(self.chain) - block_index + 1
+        }
 
     def get_balance(self, address):
         return self.state['balances'].get(address.strip(), 0)
     
-    def get_owned_tokens(self, address):
-        address = address.strip()
-        return [token for token, owner in self.state['tokens'].items() if owner == address]
+    def get_owned_tokens(self, address, offset=0, limit=None):
+        """Tokens do dono, pelo índice reverso (sem varrer todos os tokens). Aceita paginação."""
+        owned = sorted(self.state['owner_tokens'].get(address.strip(), ()))
+        return owned[offset:] if limit is None else owned[offset:offset + limit]
+
+    def count_owned_tokens(self, address):
+        return len(self.state['owner_tokens'].get(address.strip(), ()))
 
     def get_contracts(self):
         return {cid: data for cid, data in self.state['contracts'].items() if data['status'] == 'OPEN'}
@@ -549,36 +1127,64 @@ class Blockchain:
     def get_token_metadata(self, token_id):
         return self.state['token_metadata'].get(token_id, {})
 
-    def get_pending_sale_requests(self, locality):
+    def get_pending_sale_requests(self, locality, offset=0, limit=None):
+        """Fila de solicitações PENDENTES da localidade, da mais antiga para a mais nova (O(k) no tamanho da página)."""
+        queue = self.state['pending_by_locality'].get(locality, {})
+        stop = None if limit is None else offset + limit
         pending = []
-        print(f"[get_pending_sale_requests] Buscando para localidade: {locality}")
-        found_in_state = 0
-        for req_id, data in self.state['pending_sale_requests'].items():
-            found_in_state +=1
-            if data['status'] == 'PENDING' and data['locality'] == locality:
-                data_copy = data.copy()
-                data_copy['request_id'] = req_id
-                pending.append(data_copy)
-        print(f"[get_pending_sale_requests] Total de requests no estado: {found_in_state}. Encontrados {len(pending)} pendentes para {locality}.")
+        for req_id in islice(queue, offset, stop):
+            data_copy = self.state['pending_sale_requests'][req_id].copy()
+            data_copy['request_id'] = req_id
+            pending.append(data_copy)
         return pending
 
+    def count_pending_sale_requests(self, locality):
+        return len(self.state['pending_by_locality'].get(locality, {}))
+
     def get_tax_receipts(self, user_pk):
-        user_pk = user_pk.strip()
-        my_receipts = []
-        for receipt in self.state['tax_receipts']:
-            if receipt['buyer'] == user_pk:
-                my_receipts.append(receipt)
-        return my_receipts
+        receipts, _ = self.query_tax_receipts(buyer=user_pk)
+        return receipts
+
+    def query_tax_receipts(self, buyer=None, seller=None, token_id=None, from_block=None, to_block=None, cursor=None, limit=None):
+        """Recibos filtrados por comprador, vendedor, token e faixa de blocos, com paginação por cursor.
+
+        Usa o menor dos índices aplicáveis e busca binária na faixa de blocos (os recibos são
+        gravados em ordem de bloco). O cursor é a posição do último recibo da página anterior.
+        Retorna (recibos, próximo cursor ou None).
+        """
+        receipts = self.state['tax_receipts']
+        filters = {'buyer': buyer.strip() if buyer else None, 'seller': seller.strip() if seller else None, 'token_id': token_id}
+        candidates = [self.state[table].get(filters[field], []) for table, field in
+                      (('receipts_by_buyer', 'buyer'), ('receipts_by_seller', 'seller'), ('receipts_by_token', 'token_id'))
+                      if filters[field]]
+        positions = min(candidates, key=len) if candidates else range(len(receipts))
+
+        block_of = lambda position: receipts[position]['block_index']
+        lo = bisect_right(positions, cursor) if cursor is not None else 0
+        if from_block is not None:
+            lo = max(lo, bisect_left(positions, from_block, key=block_of))
+        hi = bisect_right(positions, to_block, key=block_of) if to_block is not None else len(positions)
+
+        page = []
+        for i in range(lo, hi):
+            receipt = receipts[positions[i]]
+            if any(value and receipt[field] != value for field, value in filters.items()):
+                continue
+            page.append(receipt)
+            if limit is not None and len(page) == limit:
+                return page, (positions[i] if i + 1 < hi else None)
+        return page, None
 
     def get_my_token_status(self, token_id):
-        for contract in self.state['contracts'].values():
-            if contract['token_id'] == token_id and contract['status'] == 'OPEN':
-                return "À Venda (Aprovado)"
-        for request in self.state['pending_sale_requests'].values():
-            if request['token_id'] == token_id and request['status'] == 'PENDING':
-                return "Pendente de Aprovação"
-            if request['token_id'] == token_id and request['status'] == 'REJECTED':
-                reason = request.get('reason', 'N/A')
-                return f"Venda Rejeitada ({reason[:30]}{'...' if len(reason)>30 else ''})"
-        return "Em Carteira"
+        # Pelos índices do token: um contrato OPEN tem prioridade; senão vale o pedido PENDING/REJECTED mais antigo
+        if self.state['open_contracts_by_token'].get(token_id):
+            return "À Venda (Aprovado)"
+        requests_for_token = self.state['sale_requests_by_token'].get(token_id)
+        if not requests_for_token:
+            return "Em Carteira"
+        request = self.state['pending_sale_requests'][next(iter(requests_for_token))]
+        if request['status'] == 'PENDING':
+            return "Pendente de Aprovação"
+        reason = request.get('reason') or 'N/A'
+        return f"Venda Rejeitada ({reason[:30]}{'...' if len(reason)>30 else ''})"
 
@@ -0,0 +1,218 @@
+# codec.py
+# Codificação binária compacta de blocos (e de qualquer valor JSON) para disco e rede.
+#
+# Cada valor é um byte de tipo seguido do conteúdo:
+#   inteiros em varint (zigzag), floats em 8 bytes, listas/objetos com o número de itens em varint.
+# Strings repetidas viram referências a um dicionário: ele começa com PRESET_STRINGS (chaves e
+# tipos de transação conhecidos dos dois lados) e cresce com cada string nova de 3+ caracteres,
+# na mesma ordem no codificador e no decodificador. Assim uma chave PEM que aparece em várias
+# transações da mesma mensagem é gravada uma única vez.
+# Hexadecimais (hashes, assinaturas) são gravados como bytes e chaves públicas PEM como DER,
+# desde que a conversão de volta reproduza exatamente a string original.
+#
+# JSON continua sendo o padrão: o formato binário só é usado quando pedido (--block-format binary
+# no disco, cabeçalhos Accept/Content-Type na rede).
+import base64
+import binascii
+import json
+import struct
+
+BINARY_MEDIA_TYPE = 'application/x-tokenchain-binary'
+MAGIC = b'\xb1' # Primeiro byte de um registro binário (versão 1); um registro JSON começa com '{'
+
+_NONE, _FALSE, _TRUE, _INT, _FLOAT, _STR, _REF, _LIST, _DICT, _HEX, _PEM = range(11)
+_FLOAT_STRUCT = struct.Struct('<d')
+MIN_DICTIONARY_LENGTH = 3 # Strings menores custam menos gravadas inline do que como referência
+
+# A ordem faz parte do formato: só acrescente novas entradas no final
+PRESET_STRINGS = (
+    'index', 'timestamp', 'transactions', 'proof', 'previous_hash', 'transaction', 'signature',
+    'sender', 'recipient', 'data', 'type', 'payload', 'reward', 'chain', 'length', 'blocks',
+    'headers', 'hash', 'block',
+    'MINING_REWARD', 'FAUCET', 'REGISTER_NOTARY', 'CERTIFY_IDENTITY', 'MINT_TOKEN',
+    'REQUEST_SALE_APPROVAL', 'APPROVE_SALE', 'REJECT_SALE', 'EXECUTE_SALE_CONTRACT',
+    'token_id', 'locality', 'asset_type', 'area', 'details_hash', 'request_id', 'contract_id',
+    'price', 'valid_until', 'reason',
+)
+
+_PEM_HEADER = '-----BEGIN PUBLIC KEY-----\n'
+_PEM_FOOTER = '\n-----END PUBLIC KEY-----'
+_HEX_DIGITS = frozenset('0123456789abcdef')
+
+
+def _der_to_pem(der):
+    b64 = base64.b64encode(der).decode('ascii')
+    return _PEM_HEADER + '\n'.join(b64[i:i + 64] for i in range(0, len(b64), 64)) + _PEM_FOOTER
+
+
+def _pem_to_der(text):
+    """DER da chave PEM, ou None se a string não puder ser reconstruída byte a byte a partir dele."""
+    if not (text.startswith(_PEM_HEADER) and text.endswith(_PEM_FOOTER)):
+        return None
+    try:
+        der = base64.b64decode(text[len(_PEM_HEADER):-len(_PEM_FOOTER)].replace('\n', ''), validate=True)
+    except binascii.Error:
+        return None
+    return der if _der_to_pem(der) == text else None
+
+
+class _Encoder:
+    def __init__(self):
+        self.out = bytearray(MAGIC)
+        self.strings = {text: i for i, text in enumerate(PRESET_STRINGS)}
+
+    def varint(self, n):
+        while n > 0x7f:
+            self.out.append((n & 0x7f) | 0x80)
+            n >>= 7
+        self.out.append(n)
+
+    def value(self, value):
+        if value is None:
+            self.out.append(_NONE)
+        elif value is True:
+            self.out.append(_TRUE)
+        elif value is False:
+            self.out.append(_FALSE)
+        elif isinstance(value, int):
+            self.out.append(_INT)
+            self.varint(value * 2 if value >= 0 else -value * 2 - 1)
+        elif isinstance(value, float):
+            self.out.append(_FLOAT)
+            self.out += _FLOAT_STRUCT.pack(value)
+        elif isinstance(value, str):
+            self.string(value)
+        elif isinstance(value, (list, tuple)):
+            self.out.append(_LIST)
+            self.varint(len(value))
+            for item in value:
+                self.value(item)
+        elif isinstance(value, dict):
+            self.out.append(_DICT)
+            self.varint(len(value))
+            for key, item in value.items():
+                if not isinstance(key, str):
+                    raise TypeError(f"Chave não serializável: {key!r}")
+                self.string(key)
+                self.value(item)
+        else:
+            raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
+    def string(self, text):
+        ref = self.strings.get(text)
+        if ref is not None:
+            self.out.append(_REF)
+            self.varint(ref)
+            return
+        if len(text) >= MIN_DICTIONARY_LENGTH:
+            self.strings[text] = len(self.strings)
+
+        der = _pem_to_der(text) if text.startswith(_PEM_HEADER) else None
+        if der is not None:
+            tag, raw = _PEM, der
+        elif text and len(text) % 2 == 0 and _HEX_DIGITS.issuperset(text):
+            tag, raw = _HEX, bytes.fromhex(text)
+        else:
+            tag, raw = _STR, text.encode('utf-8')
+        self.out.append(tag)
+        self.varint(len(raw))
+        self.out += raw
+
+
+class _Decoder:
+    def __init__(self, data):
+        if data[:1] != MAGIC:
+            raise ValueError("Dados não estão no formato binário de blocos.")
+        self.data = memoryview(data)
+        self.pos = 1
+        self.strings = list(PRESET_STRINGS)
+
+    def varint(self):
+        n, shift = 0, 0
+        while True:
+            byte = self.data[self.pos]
+            self.pos += 1
+            n |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return n
+            shift += 7
+
+    def raw(self):
+        length = self.varint()
+        start, self.pos = self.pos, self.pos + length
+        if self.pos > len(self.data):
+            raise ValueError("Registro binário truncado.")
+        return self.data[start:self.pos]
+
+    def value(self):
+        tag = self.data[self.pos]
+        self.pos += 1
+        if tag == _INT:
+            n = self.varint()
+            return n >> 1 if not n & 1 else -((n + 1) >> 1)
+        if tag == _REF:
+            return self.strings[self.varint()]
+        if tag in (_STR, _HEX, _PEM):
+            raw = self.raw()
+            if tag == _STR:
+                text = str(raw, 'utf-8')
+            elif tag == _HEX:
+                text = raw.hex()
+            else:
+                text = _der_to_pem(bytes(raw))
+            if len(text) >= MIN_DICTIONARY_LENGTH:
+                self.strings.append(text)
+            return text
+        if tag == _DICT:
+            result = {}
+            for _ in range(self.varint()):
+                key = self.value()
+                if not isinstance(key, str): # O codificador só grava chaves string
+                    raise ValueError(f"Chave inválida no registro binário: {type(key).__name__}")
+                result[key] = self.value()
+            return result
+        if tag == _LIST:
+            return [self.value() for _ in range(self.varint())]
+        if tag == _FLOAT:
+            start, self.pos = self.pos, self.pos + _FLOAT_STRUCT.size
+            return _FLOAT_STRUCT.unpack_from(self.data, start)[0]
+        if tag == _NONE:
+            return None
+        if tag == _TRUE:
+            return True
+        if tag == _FALSE:
+            return False
+        raise ValueError(f"Tipo desconhecido no registro binário: {tag}")
+
+
+def encode(value):
+    """Codifica um valor JSON (bloco, lista de blocos, resposta de endpoint) no formato binário."""
+    encoder = _Encoder()
+    encoder.value(value)
+    return bytes(encoder.out)
+
+
+def decode(data):
+    """Decodifica um registro binário. Qualquer entrada inválida (truncada, corrompida) gera ValueError."""
+    try:
+        decoder = _Decoder(data)
+        value = decoder.value()
+    except (IndexError, struct.error, RecursionError) as e: # Leitura além do fim, referência inexistente, aninhamento absurdo
+        raise ValueError(f"Registro binário inválido: {e}") from e
+    if decoder.pos != len(decoder.data):
+        raise ValueError("Bytes sobrando no fim do registro binário.")
+    return value
+
+
+def decode_record(data):
+    """Registro do log de blocos: binário (começa com MAGIC) ou uma linha JSON."""
+    return decode(data) if data[:1] == MAGIC else json.loads(data)
+
+
+def is_binary_response(response):
+    return response.headers.get('Content-Type', '').startswith(BINARY_MEDIA_TYPE)
+
+
+def decode_response(response):
+    """Corpo de uma resposta HTTP de outro nó, no formato em que ela veio (binário ou JSON)."""
+    return decode(response.content) if is_binary_response(response) else response.json()
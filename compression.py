@@ -0,0 +1,105 @@
+# compression.py
+# Compressão opcional (gzip sempre; zstd se o pacote 'zstandard' estiver instalado)
+# para respostas/requisições HTTP entre nós e para os segmentos do log de blocos.
+import gzip
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESS_MIN_BYTES = 1024 # Corpos menores não compensam o custo de comprimir
+MAX_DECOMPRESSED_BYTES = 16 * 1024 * 1024 # Limite de um corpo de requisição descomprimido (protege contra "bombas")
+_ZSTD_INPUT_CHUNK = 256 # Bytes comprimidos por passo: cada passo produz no máximo alguns MB
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# Da preferida para a menos preferida
+ENCODINGS = ('zstd', 'gzip') if zstandard else ('gzip',)
+FILE_EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+
+
+def check_encoding(encoding):
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Compressão indisponível: {encoding} (disponíveis: {', '.join(ENCODINGS)})")
+
+
+def compress(data, encoding):
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+class DecompressedTooLarge(ValueError):
+    """O corpo descomprimido passaria de 'max_size'."""
+
+
+def decompress(data, encoding, max_size=None):
+    """Descomprime um corpo inteiro. Dados corrompidos ou incompletos geram ValueError;
+    passar de 'max_size' bytes gera DecompressedTooLarge, sem chegar a alocar o corpo todo."""
+    if encoding == 'zstd':
+        check_encoding(encoding)
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+        chunks = (data[i:i + _ZSTD_INPUT_CHUNK] for i in range(0, len(data), _ZSTD_INPUT_CHUNK))
+        errors = zstandard.ZstdError
+    elif encoding in ('gzip', 'x-gzip'):
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) # Cabeçalho gzip
+        chunks = (data,)
+        errors = zlib.error
+    else:
+        raise ValueError(f"Content-Encoding não suportado: {encoding}")
+
+    output = bytearray()
+    try:
+        for chunk in chunks:
+            if encoding == 'zstd':
+                output += decompressor.decompress(chunk)
+            else:
+                output += decompressor.decompress(chunk, 0 if max_size is None else max_size + 1 - len(output))
+            if max_size is not None and len(output) > max_size:
+                raise DecompressedTooLarge(f"Corpo descomprimido passa de {max_size} bytes.")
+    except errors as e:
+        raise ValueError(f"Corpo comprimido ({encoding}) inválido: {e}") from e
+    if not decompressor.eof or decompressor.unused_data:
+        raise ValueError(f"Corpo comprimido ({encoding}) incompleto ou com bytes sobrando.")
+    return bytes(output)
+
+
+def choose_encoding(accept_encoding):
+    """A melhor compressão aceita pelo cliente (cabeçalho Accept-Encoding), ou None."""
+    accepted = set()
+    for item in accept_encoding.split(','):
+        name, _, params = item.partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if quality > 0:
+            accepted.add(name.strip().lower())
+    for encoding in ENCODINGS:
+        if encoding in accepted:
+            return encoding
+    return None
+
+
+def compress_file(source, destination, encoding):
+    """Comprime 'source' em 'destination' em fluxo (sem carregar o arquivo inteiro na memória)."""
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        if encoding == 'zstd':
+            zstandard.ZstdCompressor(level=ZSTD_LEVEL).copy_stream(src, dst)
+        else:
+            with gzip.GzipFile(fileobj=dst, mode='wb', compresslevel=GZIP_LEVEL) as gz:
+                while chunk := src.read(1024 * 1024):
+                    gz.write(chunk)
+
+
+def open_compressed(path, encoding):
+    """Abre um arquivo comprimido para leitura em fluxo; seek() só avança descomprimindo."""
+    if encoding == 'zstd':
+        check_encoding(encoding)
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return gzip.open(path, 'rb')
@@ -180,6 +180,9 @@ class BlockchainApp(ctk.CTk):
         self.tax_receipts_table.column('value', width=100, anchor='e')
         self.tax_receipts_table.column('tax', width=100, anchor='e')
         self.tax_receipts_table.grid(row=8, column=0, columnspan=2, padx=20, pady=10, sticky="nsew")
+        self.more_receipts_button = ctk.CTkButton(frame, text="Carregar Mais Recibos") # Receita: recibos em páginas
+        self.more_receipts_button.grid(row=9, column=0, columnspan=2, padx=20, pady=(0,10), sticky="e")
+        self.more_receipts_button.grid_remove()
 
         # Tabela de Cartórios Autorizados (Governo)
         self.notary_list_label = ctk.CTkLabel(frame, text="Cartórios Autorizados:", font=ctk.CTkFont(size=16))
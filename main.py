@@ -3,14 +3,19 @@ import customtkinter as ctk
 from gui import BlockchainApp
 from blockchain import Blockchain, TAX_RATE # Importa a taxa
 from wallet import Wallet
+from network import BlockBroadcaster, SeenSet, TipWatcher
+from mining import ProofOfWorkEngine
+from verification import SignatureVerifier
+import codec
+import compression
+import server
 import json
 import threading
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 import sys
 import os
 import hashlib
 import uuid
-import requests
 import time
 from datetime import datetime
 
@@ -22,7 +27,13 @@ except ImportError:
     GOVERNMENT_PUBLIC_KEY = "GOV_KEY_PLACEHOLDER_RUN_SETUP"
     TAX_AUTHORITY_PUBLIC_KEY = "TAX_KEY_PLACEHOLDER_RUN_SETUP"
 NETWORK_NODES = ['127.0.0.1:5001', '127.0.0.1:5002', '127.0.0.1:5003', '127.0.0.1:5004', '127.0.0.1:5005']
-SYNC_INTERVAL_MS = 10000
+SYNC_INTERVAL_MS = 60000 # Sincronização periódica: só reserva, os blocos novos chegam pelo /tip (long-poll)
+MAX_TIP_WAIT = 30 # Segundos máximos que um pedido /tip pode ficar esperando um bloco novo
+MAX_TIP_WAITERS = server.SERVER_THREADS // 2 # Pedidos /tip esperando ao mesmo tempo; o resto das threads fica livre
+MAX_MINING_ATTEMPTS = 3 # Recomeços da mineração quando outro nó estende a cadeia antes
+MINING_BATCH_DELAY_MS = 10000 # Espera após uma transação local antes de minerar: junta as pendentes da rede num só bloco
+PAGE_SIZE = 50 # Itens por página nos endpoints paginados
+MAX_PAGE_SIZE = 500
 LOCALITIES = ["São Paulo", "Rio de Janeiro", "Curitiba", "Recife", "Belo Horizonte"]
 
 # --- Gerenciador de Contas de Usuário ---
@@ -128,10 +139,14 @@ class OffChainDBManager:
 
 # --- Aplicação Principal ---
 class MainApplication(BlockchainApp):
-    def __init__(self, port):
+    def __init__(self, port, reindex=False, block_format='json', storage_compression=None, dev_server=False):
         super().__init__()
         self.withdraw()
         self.port = port
+        self.reindex = reindex # --reindex: ignora checkpoints e reconstrói o estado desde o gênesis
+        self.block_format = block_format # --block-format=binary: novos blocos gravados no formato compacto
+        self.storage_compression = storage_compression # --compress-storage=gzip|zstd: comprime segmentos fechados
+        self.dev_server = dev_server # --dev-server: servidor de desenvolvimento do Flask (depuração)
         self.title(f"Blockchain Cartório - Nó {self.port}")
 
         self.user_manager = SimpleUserManager()
@@ -142,10 +157,19 @@ class MainApplication(BlockchainApp):
         self.is_notary = False
         self.notary_locality = None
         self.chain_lock = threading.Lock()
+        self.tip_changed = threading.Condition(self.chain_lock) # Notificada (com o chain_lock) sempre que a ponta muda
+        self.tip_waiters = 0 # Pedidos /tip esperando em tip_changed
+        self.mining_lock = threading.Lock()
+        self.mining_scheduled = False # Há uma mineração em lote agendada (schedule_mining)
+        self.pow_engine = None
         self.toast_after_id = None # ID para o timer do toast
+        self.tax_receipts_limit = PAGE_SIZE # Recibos exibidos para a Receita; cresce com "Carregar Mais Recibos"
 
         self.blockchain = None
         self.flask_thread = None
+        self.broadcaster = BlockBroadcaster(on_result=self.on_broadcast_result)
+        self.seen_transactions = SeenSet() # Hashes já recebidos/repassados via /transactions/new
+        self.tip_watcher = None
         self.gui_queue = []
         self.after(250, self.process_gui_queue)
 
@@ -243,15 +267,29 @@ class MainApplication(BlockchainApp):
         self.blockchain = Blockchain(
             self.port,
             GOVERNMENT_PUBLIC_KEY,
-            TAX_AUTHORITY_PUBLIC_KEY
+            TAX_AUTHORITY_PUBLIC_KEY,
+            reindex=self.reindex,
+            block_format=self.block_format,
+            storage_compression=self.storage_compression
         )
 
         my_address = f'127.0.0.1:{self.port}'
         for node_address in NETWORK_NODES:
             if node_address != my_address: self.blockchain.add_node(node_address)
 
-        self.flask_thread = threading.Thread(target=run_flask_app, args=(self.port,), daemon=True)
+        try:
+            self.pow_engine = ProofOfWorkEngine()
+        except (OSError, ValueError) as e:
+            print(f"AVISO: PoW paralelo indisponível ({e}). Usando um único núcleo.")
+        try:
+            self.blockchain.signature_verifier = SignatureVerifier()
+        except (OSError, ValueError) as e:
+            print(f"AVISO: Verificação paralela de assinaturas indisponível ({e}). Verificando em série.")
+
+        self.flask_thread = threading.Thread(target=run_flask_app, args=(self.port, self.dev_server), daemon=True)
         self.flask_thread.start()
+        self.tip_watcher = TipWatcher(self.blockchain.peers, lambda: len(self.blockchain.chain), self.on_peer_tip)
+        self.tip_watcher.watch()
 
         self.connect_widgets()
         self.deiconify()
@@ -301,6 +339,7 @@ class MainApplication(BlockchainApp):
         self.notary_list_label.grid_remove()
         self.authorized_notaries_table.grid_remove()
         self.tax_receipts_table.grid_remove() # Esconde recibos por padrão
+        self.more_receipts_button.grid_remove()
 
         # Mostra com base no papel
         if self.is_government:
@@ -319,6 +358,8 @@ class MainApplication(BlockchainApp):
 
         else: # Usuário comum
             self.tax_receipts_table.grid(row=8, column=0, columnspan=2, padx=20, pady=10, sticky="nsew") # Mostra recibos
+            if self.current_user_wallet and self.current_user_wallet.public_key.strip() == TAX_AUTHORITY_PUBLIC_KEY.strip():
+                self.more_receipts_button.grid(row=9, column=0, columnspan=2, padx=20, pady=(0,10), sticky="e")
 
 
     def connect_widgets(self):
@@ -343,6 +384,7 @@ class MainApplication(BlockchainApp):
         self.pending_sales_table.bind('<<TreeviewSelect>>', self.on_pending_sale_select)
         self.approve_sale_button.configure(command=self.handle_approve_sale)
         self.reject_sale_button.configure(command=self.handle_reject_sale)
+        self.more_receipts_button.configure(command=self.load_more_tax_receipts)
 
 
     def select_frame(self, name):
@@ -364,9 +406,11 @@ class MainApplication(BlockchainApp):
     def periodic_sync(self):
         # A sincronização de rede sempre ocorre
         # A atualização da GUI dentro de sync_chain() será condicional
-        self.sync_chain(force_gui_update=False)
-        if self.winfo_exists():
-            self.after(SYNC_INTERVAL_MS, self.periodic_sync)
+        try:
+            self.sync_chain(force_gui_update=False)
+        finally:
+            if self.winfo_exists(): # Reagenda mesmo se a rodada falhar: é a sincronização de reserva
+                self.after(SYNC_INTERVAL_MS, self.periodic_sync)
 
     def log_event(self, event_type, message):
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -401,50 +445,132 @@ class MainApplication(BlockchainApp):
             if self.winfo_exists():
                 self.after(250, self.process_gui_queue)
 
+    def schedule_mining(self):
+        """Minera as transações pendentes daqui a MINING_BATCH_DELAY_MS, em vez de um bloco por transação.
+
+        Nesse intervalo entram no mesmo bloco as outras transações locais e as recebidas por gossip; se
+        outro nó minerá-las antes, o bloco dele as tira do mempool e nada é minerado aqui.
+        """
+        if self.mining_scheduled: return
+        self.mining_scheduled = True
+        self.after(MINING_BATCH_DELAY_MS, self._run_scheduled_mining)
+
+    def _run_scheduled_mining(self):
+        self.mining_scheduled = False
+        self.mine_block()
+
     def mine_block(self):
         new_block = None
-        with self.chain_lock:
-            if not self.blockchain or not self.current_user_wallet:
-                self.log_event("MINERAÇÃO", "Blockchain ou carteira não pronta.")
-                return
-            if not self.blockchain.pending_transactions:
-                self.log_event("MINERAÇÃO", "Nenhuma transação pendente para minerar.")
-                return
-            
-            last_block = self.blockchain.last_block
-            last_proof = 0
-            if last_block:
-                last_proof = last_block['proof']
-            
-            proof = self.blockchain.proof_of_work(last_proof)
-            self.blockchain.add_transaction("0", self.current_user_wallet.public_key, "reward", {'type': 'MINING_REWARD'})
-            
-            previous_hash = '0'
-            if last_block:
-                previous_hash = self.blockchain.hash(last_block)
-                
-            new_block = self.blockchain.create_block(proof, previous_hash)
-            
+        with self.mining_lock: # Uma mineração por vez
+            for _ in range(MAX_MINING_ATTEMPTS):
+                with self.chain_lock:
+                    if not self.blockchain or not self.current_user_wallet:
+                        self.log_event("MINERAÇÃO", "Blockchain ou carteira não pronta.")
+                        return
+                    if not self.blockchain.mempool:
+                        self.log_event("MINERAÇÃO", "Nenhuma transação pendente para minerar.")
+                        return
+                    last_block = self.blockchain.last_block
+                    last_proof = 0
+                    if last_block:
+                        last_proof = last_block['proof']
+
+                # PoW fora do chain_lock: /new_block e a sincronização seguem livres e podem cancelar a busca
+                proof = self.find_proof(last_proof)
+                if proof is None:
+                    self.log_event("MINERAÇÃO", "Mineração cancelada: bloco de outro nó chegou primeiro.")
+                    continue
+
+                with self.chain_lock:
+                    if self.blockchain.last_block is not last_block:
+                        self.log_event("MINERAÇÃO", "A ponta da cadeia mudou durante a mineração. Minerando de novo.")
+                        continue
+                    if not self.blockchain.mempool:
+                        return
+                    self.blockchain.add_transaction("0", self.current_user_wallet.public_key, "reward", {'type': 'MINING_REWARD'})
+
+                    previous_hash = '0'
+                    if last_block:
+                        previous_hash = self.blockchain.get_block_hash(last_block['index'])
+
+                    new_block = self.blockchain.create_block(proof, previous_hash)
+                    self.tip_changed.notify_all()
+                break
+
         if new_block:
             self.log_event("MINERAÇÃO", f"Novo bloco #{new_block['index']} minerado com sucesso.")
             self.broadcast_new_block(new_block)
             self.gui_queue.append({"type": "update_display"})
 
+    def find_proof(self, last_proof):
+        """PoW em todos os núcleos; cai para a busca simples se o pool de processos não estiver disponível."""
+        if self.pow_engine is None:
+            return self.blockchain.proof_of_work(last_proof)
+        proof = self.pow_engine.search(last_proof)
+        if proof is not None:
+            self.log_event("MINERAÇÃO", f"Prova encontrada em {self.pow_engine.last_duration:.2f}s "
+                                       f"({self.pow_engine.last_hashrate / 1000:.0f} kH/s, {self.pow_engine.workers} processos).")
+        return proof
+
     def broadcast_new_block(self, block):
         if not self.blockchain: return
-        self.log_event("REDE", f"Transmitindo bloco #{block['index']} para {len(self.blockchain.nodes)} nós.")
-        for node_address in self.blockchain.nodes:
-            try:
-                requests.post(f'http://{node_address}/new_block', json=block, timeout=2)
-            except requests.exceptions.RequestException:
-                self.log_event("ERRO DE REDE", f"Falha ao contatar o nó {node_address}.")
+        peers = self.blockchain.peers.available() # Nós fora do ar ficam de fora até acabar a espera
+        self.log_event("REDE", f"Transmitindo bloco #{block['index']} para {len(peers)} de {len(self.blockchain.peers)} nós.")
+        # Envio em segundo plano: um nó lento não atrasa os demais nem congela a interface
+        self.broadcaster.broadcast(block, peers)
+
+    def gossip_transaction(self, tx_data):
+        """Repassa aos vizinhos uma transação assinada que acabou de entrar na fila local."""
+        if not self.blockchain: return
+        self.seen_transactions.add(Blockchain.hash_transaction(tx_data['transaction']))
+        self.broadcaster.gossip_transaction(tx_data, self.blockchain.peers.available())
+
+    def on_broadcast_result(self, node_address, block_index, accepted, latency, attempts):
+        """Chamado pelas threads do BlockBroadcaster; atualiza a saúde do nó e registra no log (via gui_queue)."""
+        if self.blockchain:
+            if accepted is None: self.blockchain.peers.record_failure(node_address)
+            else: self.blockchain.peers.record_success(node_address)
+        if accepted is None:
+            self.log_event("ERRO DE REDE", f"Falha ao contatar o nó {node_address} após {attempts} tentativas (bloco #{block_index}).")
+        else:
+            status = "aceito" if accepted else "recusado"
+            self.log_event("REDE", f"Bloco #{block_index} {status} por {node_address} em {latency * 1000:.0f} ms (tentativa {attempts}).")
+
+    def on_peer_tip(self, node_address, length, tip_hash):
+        """Chamado pelo TipWatcher: o vizinho anunciou uma cadeia maior; baixa só o que falta, direto dele."""
+        if not self.blockchain: return
+        replaced = False
+        while True: # Cada rodada baixa no máximo uma fatia; um nó muito atrasado repete até alcançar o vizinho
+            with self.chain_lock:
+                snapshot = self.blockchain.sync_snapshot()
+            candidate = self.blockchain.fetch_sync_candidate(nodes=[node_address], snapshot=snapshot)
+            with self.chain_lock:
+                applied = self.blockchain.apply_sync_candidate(candidate)
+                if applied: self.tip_changed.notify_all()
+            replaced = replaced or applied
+            if not (applied and candidate.get('partial')): break
+        if replaced:
+            if self.pow_engine:
+                self.pow_engine.cancel()
+            self.log_event("CONSENSO", f"Cadeia atualizada até o bloco #{len(self.blockchain.chain)} (anúncio de {node_address}).")
+            self.gui_queue.append({"type": "update_display"})
 
     # CORREÇÃO: Adicionado 'force_gui_update'
     def sync_chain(self, force_gui_update=False):
         if not self.blockchain: return
-        replaced = False
+        # A consulta aos vizinhos roda fora do chain_lock (sobre uma cópia da cadeia local):
+        # mineração e /new_block não ficam bloqueados
         with self.chain_lock:
-            replaced = self.blockchain.resolve_conflicts()
+            snapshot = self.blockchain.sync_snapshot()
+        candidate = self.blockchain.fetch_sync_candidate(snapshot=snapshot)
+        with self.chain_lock:
+            replaced = self.blockchain.apply_sync_candidate(candidate)
+            if replaced: self.tip_changed.notify_all()
+        if replaced and self.pow_engine:
+            self.pow_engine.cancel() # A ponta mudou: a prova em andamento não serve mais
+        if replaced and candidate.get('partial'):
+            # Ainda atrás do vizinho: a próxima fatia vem numa nova rodada, sem travar a GUI até lá
+            self.gui_queue.append({"type": "sync_chain"})
         
         self.update_user_roles()
         
@@ -471,6 +597,10 @@ class MainApplication(BlockchainApp):
                 self.log_event("CONSENSO", "Atualização da GUI adiada (pop-up aberto).")
 
 
+    def load_more_tax_receipts(self):
+        self.tax_receipts_limit += PAGE_SIZE
+        self.update_all_displays()
+
     def update_all_displays(self):
         if not self.blockchain or not self.current_user_wallet or not self.winfo_exists() or not hasattr(self, 'address_value'):
              return
@@ -484,13 +614,24 @@ class MainApplication(BlockchainApp):
             self.my_hash_value.configure(text=my_hash)
             self.balance_value.configure(text=f"Saldo: {balance} Moedas")
             for item in self.token_table.get_children(): self.token_table.delete(item)
-            tokens = self.blockchain.get_owned_tokens(address)
-            for token_id in tokens:
-                status = self.blockchain.get_my_token_status(token_id)
+            with self.chain_lock:
+                tokens = [(token_id, self.blockchain.get_my_token_status(token_id))
+                          for token_id in self.blockchain.get_owned_tokens(address)]
+            for token_id, status in tokens:
                 action = "Solicitar Venda" if status == "Em Carteira" else ""
                 self.token_table.insert("", "end", values=(token_id, status, action), iid=token_id)
             for item in self.tax_receipts_table.get_children(): self.tax_receipts_table.delete(item)
-            receipts = self.blockchain.get_tax_receipts(address)
+            if address == TAX_AUTHORITY_PUBLIC_KEY.strip():
+                # Receita: todos os recibos, mas só as páginas já pedidas (como no endpoint /tax_receipts)
+                with self.chain_lock:
+                    receipts, next_cursor = self.blockchain.query_tax_receipts(limit=self.tax_receipts_limit)
+                self.more_receipts_button.configure(state="normal" if next_cursor is not None else "disabled")
+            else:
+                # Recibos em que o usuário comprou ou vendeu, cada consulta pelo seu índice
+                with self.chain_lock:
+                    bought, _ = self.blockchain.query_tax_receipts(buyer=address)
+                    sold, _ = self.blockchain.query_tax_receipts(seller=address)
+                receipts = sorted(bought + sold, key=lambda r: (r['block_index'], r['timestamp']))
             for r in receipts:
                  date_str = datetime.fromtimestamp(r['timestamp']).strftime('%d/%m/%Y %H:%M')
                  self.tax_receipts_table.insert("", "end", values=(
@@ -499,9 +640,11 @@ class MainApplication(BlockchainApp):
 
             # Block Explorer
             for item in self.blocks_table.get_children(): self.blocks_table.delete(item)
-            for block in reversed(self.blockchain.chain):
-                block_hash = self.blockchain.hash(block)
-                self.blocks_table.insert("", "end", values=(block['index'], len(block['transactions']), f"{block_hash[:16]}..."), iid=block['index'])
+            with self.chain_lock: # O cache de hashes só é preenchido com o chain_lock
+                rows = [(block['index'], len(block['transactions']), self.blockchain.get_block_hash(block['index']))
+                        for block in reversed(self.blockchain.chain)]
+            for block_index, tx_count, block_hash in rows:
+                self.blocks_table.insert("", "end", values=(block_index, tx_count, f"{block_hash[:16]}..."), iid=block_index)
 
             # Marketplace
             contracts = self.blockchain.get_contracts()
@@ -537,7 +680,8 @@ class MainApplication(BlockchainApp):
             if self.is_notary and self.notary_locality:
                 self.pending_sales_label.configure(text=f"Solicitações em {self.notary_locality}")
                 for item in self.pending_sales_table.get_children(): self.pending_sales_table.delete(item)
-                requests_list = self.blockchain.get_pending_sale_requests(self.notary_locality)
+                with self.chain_lock:
+                    requests_list = self.blockchain.get_pending_sale_requests(self.notary_locality)
                 for req in requests_list:
                     seller_hash = hashlib.sha256(req['seller'].encode()).hexdigest()[:16]
                     self.pending_sales_table.insert("", "end", values=(
@@ -572,7 +716,9 @@ class MainApplication(BlockchainApp):
         lines.append(f"Nº TRANSAÇÕES: {len(block['transactions'])}")
         lines.append(f"PROVA (NONCE): {block['proof']}")
         lines.append(f"HASH ANTERIOR: {block['previous_hash']}")
-        lines.append(f"HASH ATUAL...: {self.blockchain.hash(block)}")
+        with self.chain_lock:
+            block_hash = self.blockchain.get_block_hash(block['index'])
+        lines.append(f"HASH ATUAL...: {block_hash}")
         lines.append("-" * 60)
         lines.append("TRANSAÇÕES CONTIDAS NO BLOCO:")
         for i, tx_data in enumerate(block['transactions']):
@@ -873,6 +1019,8 @@ class MainApplication(BlockchainApp):
 
     # CORREÇÃO: Adicionado 'show_popup_on_success'
     def _create_signed_transaction(self, recipient, data, success_message="Ação enviada à rede.", sender_pk=None, show_popup_on_success=True):
+        # O hash da transação identifica a intenção: o nonce torna distintas duas ações iguais (ex.: mesma transferência)
+        data = dict(data, nonce=uuid.uuid4().hex)
         if sender_pk == "0":
             tx_added = False
             with self.chain_lock:
@@ -882,7 +1030,7 @@ class MainApplication(BlockchainApp):
                     self.show_message("Sucesso", success_message)
                 else:
                     self.show_toast(success_message) # Usa o toast
-                self.mine_block()
+                self.schedule_mining()
                 return True
             else:
                 self.show_message("Erro", "Falha ao enviar transação do sistema.", is_error=True)
@@ -903,12 +1051,13 @@ class MainApplication(BlockchainApp):
                  tx_added = self.blockchain.add_transaction(tx_core['sender'], tx_core['recipient'], signature, data)
 
         if tx_added:
-            print("Transação assinada e adicionada à pool. Minerando...")
+            self.gossip_transaction({'transaction': tx_core, 'signature': signature})
+            print("Transação assinada e adicionada à pool. Mineração agendada.")
             if show_popup_on_success:
                 self.show_message("Sucesso", success_message)
             else:
                 self.show_toast(success_message) # Usa o toast
-            self.mine_block()
+            self.schedule_mining()
             return True
         else:
             self.log_event("ERRO", "Falha na criação ou adição da transação. Verifique o log.")
@@ -1076,17 +1225,246 @@ class MainApplication(BlockchainApp):
 
 # --- Servidor Flask ---
 app_flask = Flask(__name__)
+
+def negotiated_response(payload):
+    """Responde no formato binário de blocos se o nó pediu (Accept); senão, em JSON."""
+    if request.accept_mimetypes.best_match(['application/json', codec.BINARY_MEDIA_TYPE]) == codec.BINARY_MEDIA_TYPE:
+        return Response(codec.encode(payload), mimetype=codec.BINARY_MEDIA_TYPE)
+    return jsonify(payload)
+
+@app_flask.after_request
+def compress_response(response):
+    """Comprime respostas grandes (gzip/zstd) quando o cliente aceita (Accept-Encoding)."""
+    if (response.direct_passthrough or response.status_code != 200
+            or 'Content-Encoding' in response.headers):
+        return response
+    data = response.get_data()
+    encoding = compression.choose_encoding(request.headers.get('Accept-Encoding', ''))
+    if encoding is None or len(data) < compression.COMPRESS_MIN_BYTES:
+        return response
+    response.set_data(compression.compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+def request_body():
+    """Corpo da requisição, descomprimido (até MAX_DECOMPRESSED_BYTES) se veio com Content-Encoding."""
+    data = request.get_data()
+    if request.content_encoding:
+        data = compression.decompress(data, request.content_encoding, compression.MAX_DECOMPRESSED_BYTES)
+    return data
+
 @app_flask.route('/chain', methods=['GET'])
 def full_chain():
     if 'main_app' in globals() and main_app.blockchain is not None:
-        return jsonify({'chain': main_app.blockchain.chain, 'length': len(main_app.blockchain.chain)}), 200
+        with main_app.chain_lock:
+            chain = list(main_app.blockchain.chain)
+        return negotiated_response({'chain': chain, 'length': len(chain)}), 200
     return "Blockchain não inicializada", 503
 
+@app_flask.route('/headers', methods=['GET'])
+def headers():
+    if 'main_app' not in globals() or main_app.blockchain is None:
+        return "Blockchain não inicializada", 503
+    start = request.args.get('from', 1, type=int)
+    with main_app.chain_lock: # get_headers preenche o cache de hashes
+        payload = {'headers': main_app.blockchain.get_headers(start), 'length': len(main_app.blockchain.chain)}
+    return negotiated_response(payload), 200
+
+@app_flask.route('/blocks', methods=['GET'])
+def blocks_range():
+    if 'main_app' not in globals() or main_app.blockchain is None:
+        return "Blockchain não inicializada", 503
+    start = request.args.get('from', 1, type=int)
+    with main_app.chain_lock:
+        end = request.args.get('to', len(main_app.blockchain.chain), type=int)
+        payload = {'blocks': main_app.blockchain.get_blocks(start, end), 'length': len(main_app.blockchain.chain)}
+    return negotiated_response(payload), 200
+
+@app_flask.route('/tokens', methods=['GET'])
+def owned_tokens():
+    if 'main_app' not in globals() or main_app.blockchain is None:
+        return "Blockchain não inicializada", 503
+    owner = request.args.get('owner', '')
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    if not owner: return "Parâmetro 'owner' (chave pública) é obrigatório.", 400
+    with main_app.chain_lock: # owner_tokens é alterado pelas threads que aplicam blocos
+        tokens = main_app.blockchain.get_owned_tokens(owner, offset, limit)
+        total = main_app.blockchain.count_owned_tokens(owner)
+    return jsonify({'tokens': tokens, 'total': total, 'offset': offset, 'limit': limit}), 200
+
+@app_flask.route('/sale_requests/pending', methods=['GET'])
+def pending_sale_requests():
+    if 'main_app' not in globals() or main_app.blockchain is None:
+        return "Blockchain não inicializada", 503
+    locality = request.args.get('locality', '')
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    if not locality: return "Parâmetro 'locality' é obrigatório.", 400
+    with main_app.chain_lock: # pending_by_locality é alterado pelas threads que aplicam blocos
+        requests_page = main_app.blockchain.get_pending_sale_requests(locality, offset, limit)
+        total = main_app.blockchain.count_pending_sale_requests(locality)
+    return jsonify({'requests': requests_page, 'total': total, 'offset': offset, 'limit': limit}), 200
+
+@app_flask.route('/tax_receipts', methods=['GET'])
+def tax_receipts():
+    if 'main_app' not in globals() or main_app.blockchain is None:
+        return "Blockchain não inicializada", 503
+    limit = min(max(request.args.get('limit', PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    with main_app.chain_lock: # Uma reorganização pode desfazer recibos no meio da consulta
+        receipts, next_cursor = main_app.blockchain.query_tax_receipts(
+            buyer=request.args.get('buyer'),
+            seller=request.args.get('seller'),
+            token_id=request.args.get('token_id'),
+            from_block=request.args.get('from_block', type=int),
+            to_block=request.args.get('to_block', type=int),
+            cursor=request.args.get('cursor', type=int),
+            limit=limit
+        )
+    return jsonify({'receipts': receipts, 'next_cursor': next_cursor}), 200
+
+@app_flask.route('/mempool', methods=['GET'])
+def mempool_stats():
+    if 'main_app' not in globals() or main_app.blockchain is None:
+        return "Blockchain não inicializada", 503
+    with main_app.chain_lock:
+        stats = main_app.blockchain.mempool.stats()
+    verifier = main_app.blockchain.signature_verifier
+    stats['verifier_cache'] = {
+        'local': Wallet.verifier_cache_stats(),
+        'workers': verifier.cache_stats() if verifier is not None else None
+    }
+    return jsonify(stats), 200
+
+@app_flask.route('/tx/<tx_hash>', methods=['GET'])
+def transaction_lookup(tx_hash):
+    if 'main_app' not in globals() or main_app.blockchain is None:
+        return "Blockchain não inicializada", 503
+    with main_app.chain_lock:
+        found = main_app.blockchain.get_transaction(tx_hash)
+    if found is None:
+        return "Transação não encontrada.", 404
+    return jsonify(found), 200
+
+@app_flask.route('/token/<token_id>/history', methods=['GET'])
+def token_history(token_id):
+    if 'main_app' not in globals() or main_app.blockchain is None:
+        return "Blockchain não inicializada", 503
+    with main_app.chain_lock: # Os eventos apontam para posições na cadeia, que uma reorganização troca
+        if token_id not in main_app.blockchain.state['tokens']:
+            return "Ativo não encontrado.", 404
+        events = main_app.blockchain.get_token_events(token_id)
+    return jsonify({'token_id': token_id, 'events': events}), 200
+
+@app_flask.route('/block/<int:index>', methods=['GET'])
+def get_block(index):
+    if 'main_app' not in globals() or main_app.blockchain is None:
+        return "Blockchain não inicializada", 503
+    with main_app.chain_lock:
+        if index < 1 or index > len(main_app.blockchain.chain):
+            return "Bloco não encontrado.", 404
+        payload = {'block': main_app.blockchain.chain[index - 1], 'hash': main_app.blockchain.get_block_hash(index)}
+    return negotiated_response(payload), 200
+
+@app_flask.route('/transactions/new', methods=['POST'])
+def new_transaction():
+    if 'main_app' not in globals() or main_app.blockchain is None:
+        return "Blockchain não inicializada", 503
+    tx_data = request.get_json(silent=True)
+    try:
+        tx = tx_data['transaction']
+        sender, recipient, data, signature = tx['sender'], tx['recipient'], tx['data'], tx_data['signature']
+    except (TypeError, KeyError):
+        return "Transação malformada.", 400
+    if not isinstance(sender, str) or not isinstance(recipient, str) or not isinstance(data, dict) or sender.strip() == "0":
+        return "Transação malformada.", 400 # Transações do sistema (recompensas) não circulam pela rede
+
+    # Só entra em seen_transactions depois de aceita (gossip_transaction): uma transação recusada agora,
+    # por exemplo por faltar um bloco que este nó ainda não recebeu, pode ser aceita num repasse seguinte
+    if Blockchain.hash_transaction(tx) in main_app.seen_transactions:
+        return "Transação já conhecida.", 200
+    with main_app.chain_lock:
+        tx_added = main_app.blockchain.add_transaction(sender, recipient, signature, data)
+    if not tx_added:
+        return "Transação recusada.", 400
+
+    main_app.gossip_transaction({'transaction': {'sender': sender.strip(), 'recipient': recipient.strip(), 'data': data},
+                                 'signature': signature})
+    main_app.log_event("REDE", f"Transação {data.get('type')} recebida de outro nó e repassada.")
+    main_app.gui_queue.append({"type": "update_display"})
+    return "Transação adicionada à fila de pendentes.", 201
+
+@app_flask.route('/peers', methods=['GET'])
+def list_peers():
+    if 'main_app' not in globals() or main_app.blockchain is None:
+        return "Blockchain não inicializada", 503
+    peers = main_app.blockchain.peers.stats()
+    latencies = main_app.broadcaster.latencies() # Do envio de blocos e transações (BlockBroadcaster)
+    for address, info in peers.items():
+        latency = latencies.get(address)
+        info['broadcast_latency_ms'] = round(latency * 1000, 1) if latency is not None else None
+    return jsonify({'peers': peers}), 200
+
+@app_flask.route('/peers', methods=['POST'])
+def add_peer():
+    if 'main_app' not in globals() or main_app.blockchain is None:
+        return "Blockchain não inicializada", 503
+    address = (request.get_json(silent=True) or {}).get('address', '')
+    host, _, port = address.strip().rpartition(':') if isinstance(address, str) else ('', '', '')
+    if not host or not port.isdigit():
+        return "Endereço inválido (esperado host:porta).", 400
+    if not main_app.blockchain.add_node(f'{host}:{port}'):
+        return "Nó já conhecido.", 200
+    if main_app.tip_watcher:
+        main_app.tip_watcher.watch()
+    main_app.log_event("REDE", f"Nó {host}:{port} adicionado.")
+    return "Nó adicionado.", 201
+
+@app_flask.route('/peers/<address>', methods=['DELETE'])
+def remove_peer(address):
+    if 'main_app' not in globals() or main_app.blockchain is None:
+        return "Blockchain não inicializada", 503
+    if not main_app.blockchain.remove_node(address):
+        return "Nó não encontrado.", 404
+    main_app.log_event("REDE", f"Nó {address} removido.")
+    return "Nó removido.", 200
+
+@app_flask.route('/tip', methods=['GET'])
+def chain_tip():
+    """Ponta da cadeia. Com 'after' e 'wait', espera até 'wait' segundos por uma cadeia maior que 'after' (long-poll)."""
+    if 'main_app' not in globals() or main_app.blockchain is None:
+        return "Blockchain não inicializada", 503
+    after = request.args.get('after', 0, type=int)
+    wait = min(max(request.args.get('wait', 0, type=float), 0), MAX_TIP_WAIT)
+    with main_app.tip_changed:
+        if wait and len(main_app.blockchain.chain) <= after:
+            if main_app.tip_waiters >= MAX_TIP_WAITERS:
+                return "Muitos nós aguardando a ponta da cadeia.", 503
+            main_app.tip_waiters += 1
+            try:
+                main_app.tip_changed.wait_for(lambda: len(main_app.blockchain.chain) > after, wait)
+            finally:
+                main_app.tip_waiters -= 1
+        length = len(main_app.blockchain.chain)
+        tip_hash = main_app.blockchain.get_block_hash(length) if length else None
+    return jsonify({'length': length, 'hash': tip_hash}), 200
+
 @app_flask.route('/new_block', methods=['POST'])
 def new_block():
     if 'main_app' not in globals() or main_app.blockchain is None:
         return "Blockchain não inicializada", 503
-    block = request.get_json()
+    try:
+        if request.mimetype == codec.BINARY_MEDIA_TYPE:
+            block = codec.decode(request_body())
+        elif request.content_encoding:
+            block = json.loads(request_body())
+        else:
+            block = request.get_json()
+    except compression.DecompressedTooLarge:
+        return "Bloco grande demais.", 413
+    except (ValueError, OSError, EOFError):
+        return "Bloco inválido ou corrompido.", 400
     if not block: return "Dados do bloco ausentes.", 400
     
     block_accepted = False
@@ -1095,10 +1473,13 @@ def new_block():
     with main_app.chain_lock:
         if main_app.blockchain.add_block(block):
             block_accepted = True
+            main_app.tip_changed.notify_all()
         else:
             sync_needed = True
             
     if block_accepted:
+        if main_app.pow_engine:
+            main_app.pow_engine.cancel() # Um bloco válido de outro nó torna a mineração local obsoleta
         main_app.log_event("REDE", f"Bloco #{block['index']} recebido e aceito.")
         main_app.gui_queue.append({"type": "update_display"})
         return "Bloco aceito.", 200
@@ -1107,12 +1488,37 @@ def new_block():
         main_app.gui_queue.append({"type": "sync_chain"})
         return "Bloco rejeitado, enfileirando sincronização.", 400
 
-def run_flask_app(port):
-    app_flask.run(host='0.0.0.0', port=port)
+def run_flask_app(port, dev_server=False):
+    if dev_server:
+        app_flask.run(host='0.0.0.0', port=port)
+    else:
+        server.serve(app_flask, '0.0.0.0', port)
+
+VALUE_OPTIONS = ('--block-format', '--compress-storage') # Opções que recebem um valor
+
+def parse_command_line(argv):
+    """Separa argumentos posicionais e opções; aceita '--opção=valor' e '--opção valor'."""
+    positional, options = [], {}
+    arguments = iter(argv)
+    for arg in arguments:
+        if not arg.startswith('--'):
+            positional.append(arg)
+            continue
+        name, has_value, value = arg.partition('=')
+        if name in VALUE_OPTIONS and not has_value:
+            value = next(arguments, '')
+        options[name] = value if name in VALUE_OPTIONS else True
+    return positional, options
 
 if __name__ == '__main__':
-    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5001
+    args, options = parse_command_line(sys.argv[1:])
+    port = int(args[0]) if args else 5001
     global main_app
-    main_app = MainApplication(port=port)
+    block_format = options.get('--block-format', 'json')
+    if block_format not in ('json', 'binary'):
+        sys.exit(f"--block-format inválido: '{block_format}' (use json ou binary).")
+    storage_compression = options.get('--compress-storage')
+    main_app = MainApplication(port=port, reindex='--reindex' in options, block_format=block_format,
+                               storage_compression=storage_compression, dev_server='--dev-server' in options)
     main_app.mainloop()
 
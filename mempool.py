@@ -0,0 +1,104 @@
+# mempool.py
+# Transações pendentes, indexadas pelo hash canônico (EncodedTransaction.hash).
+import time
+from collections import OrderedDict
+from transaction import EncodedTransaction
+
+MAX_MEMPOOL_TRANSACTIONS = 5000        # Limite de transações pendentes
+MAX_MEMPOOL_BYTES = 5 * 1024 * 1024    # Limite da soma dos tamanhos serializados
+
+
+class Mempool:
+    """Fila de transações pendentes em ordem de chegada, sem duplicatas e com tamanho limitado.
+
+    Ao passar de um dos limites, as transações mais antigas são descartadas primeiro.
+    """
+
+    def __init__(self, max_transactions=MAX_MEMPOOL_TRANSACTIONS, max_bytes=MAX_MEMPOOL_BYTES):
+        self.max_transactions = max_transactions
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # {hash: (EncodedTransaction, instante de entrada)}
+        self.total_bytes = 0
+        self.evicted = 0               # Descartadas por falta de espaço
+        self.duplicates = 0            # Recusadas por já estarem na fila
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return (encoded.tx_data for encoded, _ in self._entries.values())
+
+    def encoded(self):
+        """As transações pendentes já serializadas (EncodedTransaction), em ordem de chegada."""
+        return (encoded for encoded, _ in self._entries.values())
+
+    def __contains__(self, tx_hash):
+        return tx_hash in self._entries
+
+    def add(self, tx_data):
+        """Enfileira a transação (item de bloco ou EncodedTransaction).
+
+        Retorna o hash, ou None se ela já estava na fila ou não cabe nela.
+        """
+        encoded = tx_data if isinstance(tx_data, EncodedTransaction) else EncodedTransaction(tx_data)
+        tx_hash, size = encoded.hash, encoded.size
+        if tx_hash in self._entries:
+            self.duplicates += 1
+            return None
+        if size > self.max_bytes:
+            return None
+        while self._entries and (len(self._entries) >= self.max_transactions
+                                 or self.total_bytes + size > self.max_bytes):
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted.size
+            self.evicted += 1
+        self._entries[tx_hash] = (encoded, time.time())
+        self.total_bytes += size
+        return tx_hash
+
+    def remove(self, tx_hash):
+        entry = self._entries.pop(tx_hash, None)
+        if entry is None:
+            return False
+        self.total_bytes -= entry[0].size
+        return True
+
+    def remove_many(self, tx_hashes):
+        """Remove as transações incluídas num bloco: O(1) por transação. Retorna quantas estavam na fila."""
+        return sum(self.remove(tx_hash) for tx_hash in tx_hashes)
+
+    def requeue(self, transactions):
+        """Devolve à frente da fila, na ordem original, transações de blocos desfeitos numa reorganização.
+
+        Elas são anteriores às pendentes atuais (que podem depender delas). Sem espaço, as mais antigas
+        ficam de fora, como no descarte normal. Retorna quantas voltaram à fila.
+        """
+        requeued = 0
+        for encoded in reversed(list(transactions)):
+            if encoded.hash in self._entries:
+                continue
+            if len(self._entries) >= self.max_transactions or self.total_bytes + encoded.size > self.max_bytes:
+                self.evicted += 1
+                continue
+            self._entries[encoded.hash] = (encoded, time.time())
+            self._entries.move_to_end(encoded.hash, last=False)
+            self.total_bytes += encoded.size
+            requeued += 1
+        return requeued
+
+    def clear(self):
+        self._entries.clear()
+        self.total_bytes = 0
+
+    def stats(self):
+        now = time.time()
+        oldest = next(iter(self._entries.values()), None)
+        return {
+            'count': len(self._entries),
+            'bytes': self.total_bytes,
+            'max_transactions': self.max_transactions,
+            'max_bytes': self.max_bytes,
+            'oldest_age': now - oldest[1] if oldest else 0.0,
+            'evicted': self.evicted,
+            'duplicates': self.duplicates
+        }
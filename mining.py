@@ -0,0 +1,79 @@
+# mining.py
+# Prova de trabalho paralela: divide o espaço de nonces entre processos (um por núcleo).
+import hashlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+CHUNK_SIZE = 50000        # Nonces por tarefa enviada a um processo
+CANCEL_CHECK_EVERY = 4096 # A cada quantos nonces o processo verifica o pedido de cancelamento
+DIFFICULTY_PREFIX = b'\x00\x00' # Mesmo critério de Blockchain.valid_proof ("0000" em hexadecimal)
+
+_stop_event = None
+
+
+def _init_worker(stop_event):
+    global _stop_event
+    _stop_event = stop_event
+
+
+def _search_range(last_proof, start, end):
+    """Procura um nonce válido em [start, end). Retorna (nonce ou None, hashes calculados)."""
+    prefix = str(last_proof).encode()
+    sha256 = hashlib.sha256
+    difficulty_len = len(DIFFICULTY_PREFIX)
+    for proof in range(start, end):
+        if sha256(prefix + str(proof).encode()).digest()[:difficulty_len] == DIFFICULTY_PREFIX:
+            return proof, proof - start + 1
+        if (proof - start) % CANCEL_CHECK_EVERY == 0 and _stop_event.is_set():
+            return None, proof - start + 1
+    return None, end - start
+
+
+class ProofOfWorkEngine:
+    """Pool de processos reutilizado entre blocos; search() pode ser interrompido por cancel() de outra thread."""
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        # 'spawn' evita fazer fork de um processo com Tk e threads do Flask
+        context = multiprocessing.get_context('spawn')
+        self._stop_event = context.Event()
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                         initializer=_init_worker, initargs=(self._stop_event,))
+        self.last_hashrate = 0.0  # hashes/s da última busca
+        self.last_duration = 0.0
+
+    def search(self, last_proof):
+        """Retorna a prova para 'last_proof', ou None se a busca foi cancelada."""
+        self._stop_event.clear()
+        start_time = time.time()
+        next_start, hashes, found = 0, 0, None
+        pending = set()
+        for _ in range(self.workers * 2):  # Mantém todos os processos ocupados
+            pending.add(self._pool.submit(_search_range, last_proof, next_start, next_start + CHUNK_SIZE))
+            next_start += CHUNK_SIZE
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                proof, count = future.result()
+                hashes += count
+                if proof is not None and (found is None or proof < found):
+                    found = proof
+            if found is not None or self._stop_event.is_set():
+                self._stop_event.set()  # Encerra os intervalos ainda em andamento
+                continue
+            for _ in done:
+                pending.add(self._pool.submit(_search_range, last_proof, next_start, next_start + CHUNK_SIZE))
+                next_start += CHUNK_SIZE
+        self.last_duration = time.time() - start_time
+        self.last_hashrate = hashes / self.last_duration if self.last_duration > 0 else 0.0
+        return found
+
+    def cancel(self):
+        """Interrompe a busca em andamento (ex.: chegou um bloco válido de outro nó)."""
+        self._stop_event.set()
+
+    def shutdown(self):
+        self._stop_event.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
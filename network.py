@@ -0,0 +1,270 @@
+# network.py
+# Comunicação de saída com os outros nós da rede.
+import queue
+import threading
+import time
+from collections import OrderedDict
+import requests
+import codec
+import compression
+
+BROADCAST_TIMEOUT = 2    # Timeout (s) de cada envio
+BROADCAST_RETRIES = 3    # Tentativas por bloco e por nó
+BROADCAST_BACKOFF = 0.5  # Espera (s) antes da 2ª tentativa; dobra a cada nova falha
+SEEN_TRANSACTIONS = 20000 # Hashes de transações lembrados para não revalidar nem repropagar
+PEER_BACKOFF_BASE = 2     # Espera (s) após a 1ª falha de um nó; dobra a cada falha seguida
+PEER_BACKOFF_MAX = 300    # Teto da espera (s) entre tentativas a um nó fora do ar
+LATENCY_SMOOTHING = 0.3   # Peso da medição nova na média móvel de latência
+TIP_WAIT = 25             # Segundos que um pedido /tip fica aberto no vizinho esperando um bloco novo
+TIP_RETRY = 1             # Espera (s) antes de reabrir a escuta de um nó em espera ou lotado
+
+
+class _PeerSender(threading.Thread):
+    """Fila e sessão HTTP (keep-alive) exclusivas de um nó; envia blocos e transações na ordem em que surgiram."""
+
+    def __init__(self, node, on_result):
+        super().__init__(daemon=True, name=f"broadcast-{node}")
+        self.node = node
+        self.on_result = on_result
+        self.queue = queue.Queue()
+        self.session = requests.Session()
+        self.last_latency = None
+        self.binary = True # Envia no formato binário até o nó responder 415 (nó antigo, só JSON)
+        self.gossip = True # Repassa transações até o nó responder 404 (nó sem /transactions/new)
+
+    def run(self):
+        while True:
+            kind, item, queued_at = self.queue.get()
+            if kind == 'block':
+                self._send(item, queued_at)
+            elif self.gossip:
+                self._send_transaction(item)
+
+    def _send(self, block, queued_at):
+        delay = BROADCAST_BACKOFF
+        for attempt in range(1, BROADCAST_RETRIES + 1):
+            try:
+                response = self._post(block)
+                if response.status_code == 415 and self.binary:
+                    self.binary = False
+                    response = self._post(block)
+                # Um bloco recusado (400) não é reenviado: o nó de destino enfileira a própria sincronização
+                self.last_latency = time.time() - queued_at
+                self.on_result(self.node, block['index'], response.status_code == 200, self.last_latency, attempt)
+                return
+            except requests.exceptions.RequestException:
+                if attempt < BROADCAST_RETRIES:
+                    time.sleep(delay)
+                    delay *= 2
+        self.on_result(self.node, block['index'], None, time.time() - queued_at, BROADCAST_RETRIES)
+
+    def _send_transaction(self, tx_data):
+        """Uma tentativa só: os demais nós que receberam a transação também a repassam."""
+        try:
+            response = self.session.post(f'http://{self.node}/transactions/new', json=tx_data, timeout=BROADCAST_TIMEOUT)
+            if response.status_code == 404:
+                self.gossip = False
+        except requests.exceptions.RequestException:
+            pass
+
+    def _post(self, block):
+        if self.binary:
+            # Só nós novos aceitam o formato binário, e eles também aceitam corpo comprimido
+            data, headers = codec.encode(block), {'Content-Type': codec.BINARY_MEDIA_TYPE}
+            if len(data) >= compression.COMPRESS_MIN_BYTES:
+                data = compression.compress(data, 'gzip')
+                headers['Content-Encoding'] = 'gzip'
+            return self.session.post(f'http://{self.node}/new_block', data=data, headers=headers, timeout=BROADCAST_TIMEOUT)
+        return self.session.post(f'http://{self.node}/new_block', json=block, timeout=BROADCAST_TIMEOUT)
+
+
+class BlockBroadcaster:
+    """Propaga blocos em segundo plano, em paralelo para todos os nós.
+
+    on_result(node, block_index, accepted, latency, attempts) é chamado da thread do nó;
+    accepted é True/False conforme a resposta, ou None se o nó não pôde ser contatado.
+    """
+
+    def __init__(self, on_result):
+        self.on_result = on_result
+        self._senders = {}
+        self._lock = threading.Lock()
+
+    def _sender(self, node):
+        with self._lock:
+            sender = self._senders.get(node)
+            if sender is None:
+                sender = _PeerSender(node, self.on_result)
+                sender.start()
+                self._senders[node] = sender
+            return sender
+
+    def broadcast(self, block, nodes):
+        """Enfileira o bloco para cada nó e retorna imediatamente."""
+        queued_at = time.time()
+        for node in nodes:
+            self._sender(node).queue.put(('block', block, queued_at))
+
+    def gossip_transaction(self, tx_data, nodes):
+        """Repassa uma transação pendente ({'transaction', 'signature'}) a cada nó, em segundo plano."""
+        queued_at = time.time()
+        for node in nodes:
+            self._sender(node).queue.put(('transaction', tx_data, queued_at))
+
+    def latencies(self):
+        """Última latência de propagação (s) observada para cada nó."""
+        with self._lock:
+            return {node: sender.last_latency for node, sender in self._senders.items()}
+
+
+class SeenSet:
+    """Conjunto limitado (LRU) de hashes vistos recentemente; seguro entre threads."""
+
+    def __init__(self, capacity=SEEN_TRANSACTIONS):
+        self.capacity = capacity
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def add(self, key):
+        """Registra 'key'. Retorna True se ela ainda não tinha sido vista."""
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return False
+            self._items[key] = None
+            if len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+            return True
+
+
+class PeerManager:
+    """Vizinhos conhecidos, com latência, falhas seguidas e último contato de cada um.
+
+    Um nó que falha fica de fora por PEER_BACKOFF_BASE * 2^(falhas - 1) segundos (até PEER_BACKOFF_MAX);
+    depois disso volta a ser tentado uma vez. Qualquer resposta zera as falhas. Seguro entre threads.
+    """
+
+    def __init__(self):
+        self._peers = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._peers)
+
+    def __contains__(self, address):
+        return address in self._peers
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._peers))
+
+    def add(self, address):
+        """Retorna False se o nó já era conhecido."""
+        with self._lock:
+            if address in self._peers:
+                return False
+            self._peers[address] = {'latency': None, 'failures': 0, 'last_seen': None, 'retry_at': 0.0}
+            return True
+
+    def remove(self, address):
+        with self._lock:
+            return self._peers.pop(address, None) is not None
+
+    def available(self):
+        """Nós fora de espera, do mais rápido para o mais lento (nós ainda não medidos primeiro)."""
+        now = time.time()
+        with self._lock:
+            ready = [(info['latency'] or 0.0, address) for address, info in self._peers.items() if info['retry_at'] <= now]
+        return [address for _, address in sorted(ready)]
+
+    def record_success(self, address, latency=None):
+        with self._lock:
+            info = self._peers.get(address)
+            if info is None: return
+            if latency is not None:
+                info['latency'] = latency if info['latency'] is None else \
+                    (1 - LATENCY_SMOOTHING) * info['latency'] + LATENCY_SMOOTHING * latency
+            info['failures'], info['retry_at'], info['last_seen'] = 0, 0.0, time.time()
+
+    def record_failure(self, address):
+        with self._lock:
+            info = self._peers.get(address)
+            if info is None: return
+            info['failures'] += 1
+            info['retry_at'] = time.time() + min(PEER_BACKOFF_BASE * 2 ** (info['failures'] - 1), PEER_BACKOFF_MAX)
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return {address: {
+                'latency_ms': round(info['latency'] * 1000, 1) if info['latency'] is not None else None,
+                'failures': info['failures'],
+                'last_seen': info['last_seen'],
+                'backoff_remaining': round(max(info['retry_at'] - now, 0.0), 1)
+            } for address, info in self._peers.items()}
+
+
+class TipWatcher:
+    """Escuta a ponta da cadeia de cada vizinho por long-poll (GET /tip) e avisa assim que ela cresce.
+
+    on_tip(node, length, tip_hash) é chamado da thread do nó quando ele anuncia uma cadeia maior que
+    local_height(). Cada anúncio é entregue uma vez: a escuta seguinte espera uma ponta além dele.
+    Nós sem /tip (404) deixam de ser escutados e ficam só com a sincronização periódica.
+    """
+
+    def __init__(self, peers, local_height, on_tip):
+        self.peers = peers
+        self.local_height = local_height
+        self.on_tip = on_tip
+        self._threads = {}
+        self._unsupported = set()
+        self._lock = threading.Lock()
+
+    def watch(self):
+        """Começa a escutar os vizinhos conhecidos que ainda não têm uma thread de escuta."""
+        with self._lock:
+            for node in self.peers:
+                if node not in self._threads and node not in self._unsupported:
+                    thread = threading.Thread(target=self._watch, args=(node,), daemon=True, name=f"tip-{node}")
+                    self._threads[node] = thread
+                    thread.start()
+
+    def _watch(self, node):
+        session = requests.Session()
+        announced = 0
+        try:
+            while node in self.peers: # Nó removido: a thread termina depois da escuta em andamento
+                if node not in self.peers.available():
+                    time.sleep(TIP_RETRY)
+                    continue
+                known = max(self.local_height(), announced)
+                try:
+                    response = session.get(f'http://{node}/tip', params={'after': known, 'wait': TIP_WAIT},
+                                           timeout=TIP_WAIT + BROADCAST_TIMEOUT)
+                except requests.exceptions.RequestException:
+                    self.peers.record_failure(node)
+                    continue
+                if response.status_code == 404:
+                    with self._lock:
+                        self._unsupported.add(node)
+                    return
+                if response.status_code != 200: # Vizinho com escutas demais (503): tenta de novo depois
+                    time.sleep(TIP_RETRY)
+                    continue
+                self.peers.record_success(node)
+                try:
+                    tip = response.json()
+                    length = tip['length']
+                except (ValueError, KeyError, TypeError):
+                    time.sleep(TIP_RETRY)
+                    continue
+                if length > known:
+                    announced = length
+                    self.on_tip(node, length, tip.get('hash'))
+        finally:
+            with self._lock:
+                self._threads.pop(node, None)
@@ -0,0 +1,81 @@
+# server.py
+# Servidor HTTP do nó: número fixo de threads, fila de requisições limitada e timeout por conexão.
+#
+# Usa o waitress se estiver instalado; senão, um servidor WSGI do Werkzeug com pool de threads.
+# Nos dois casos, quando a fila enche, o nó responde 503 em vez de acumular conexões.
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+try:
+    import waitress
+except ImportError:
+    waitress = None
+
+SERVER_THREADS = 8          # Requisições atendidas em paralelo
+MAX_QUEUED_REQUESTS = 64    # Conexões aceitas esperando uma thread livre; além disso, 503
+REQUEST_TIMEOUT = 10        # Segundos sem dados do cliente antes de fechar a conexão
+LISTEN_BACKLOG = 128        # Conexões ainda não aceitas, na fila do sistema operacional
+
+_BUSY_RESPONSE = (b"HTTP/1.0 503 Service Unavailable\r\n"
+                  b"Retry-After: 1\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+
+
+class _RequestHandler(WSGIRequestHandler):
+    protocol_version = "HTTP/1.0" # Uma requisição por conexão: nenhuma thread fica presa a um keep-alive ocioso
+
+    def log_request(self, code='-', size='-'):
+        pass # Sem log de acesso por requisição (erros continuam sendo registrados)
+
+
+class BoundedWSGIServer(BaseWSGIServer):
+    """Servidor WSGI do Werkzeug com pool fixo de threads e fila limitada."""
+    multithread = True
+    request_queue_size = LISTEN_BACKLOG
+
+    def __init__(self, host, port, app, threads=SERVER_THREADS, max_queued=MAX_QUEUED_REQUESTS,
+                 request_timeout=REQUEST_TIMEOUT):
+        super().__init__(host, port, app, handler=_RequestHandler)
+        self.request_timeout = request_timeout
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='http')
+        self._slots = threading.BoundedSemaphore(threads + max_queued)
+        self.rejected = 0 # Requisições recusadas com 503 por falta de espaço na fila
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            try:
+                request.sendall(_BUSY_RESPONSE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        request.settimeout(self.request_timeout)
+        self._pool.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except (socket.timeout, ConnectionError):
+            pass # Cliente lento ou que desistiu: só libera a thread
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def serve(app, host, port, threads=SERVER_THREADS, max_queued=MAX_QUEUED_REQUESTS, request_timeout=REQUEST_TIMEOUT):
+    """Atende 'app' até o processo terminar (chamar numa thread daemon)."""
+    if waitress is not None:
+        print(f"[Servidor] waitress em {host}:{port} ({threads} threads, até {threads + max_queued} conexões).")
+        waitress.serve(app, host=host, port=port, threads=threads, connection_limit=threads + max_queued,
+                       channel_timeout=request_timeout, backlog=LISTEN_BACKLOG, ident=None, _quiet=True)
+        return
+    print(f"[Servidor] Werkzeug com pool em {host}:{port} ({threads} threads, fila de {max_queued}).")
+    BoundedWSGIServer(host, port, app, threads, max_queued, request_timeout).serve_forever()
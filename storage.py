@@ -0,0 +1,227 @@
+# storage.py
+# Armazenamento append-only da cadeia de blocos.
+#
+# Cada bloco é gravado como um registro no segmento atual (segment_00000.log, segment_00001.log, ...):
+# uma linha JSON compacta ou, com block_format='binary', o formato de codec.py. Os dois podem
+# conviver no mesmo log, pois cada registro é identificado pelo primeiro byte. Um índice de tamanho fixo
+# (index.bin) guarda, para cada bloco, (segmento, offset, tamanho), o que permite
+# ler um bloco qualquer sem varrer os segmentos e truncar a cadeia em O(1) numa reorganização.
+# Com 'compression' (gzip/zstd), cada segmento é comprimido quando deixa de receber blocos;
+# os offsets do índice continuam se referindo aos bytes descomprimidos.
+#
+# CheckpointStore guarda fotografias periódicas do estado para acelerar a inicialização do nó.
+import json
+import os
+import shutil
+import struct
+import codec
+import compression as compression_codecs
+
+SEGMENT_MAX_BYTES = 8 * 1024 * 1024  # Rotaciona o segmento ao passar de 8 MB
+INDEX_RECORD = struct.Struct('<IQI')  # (segmento, offset, tamanho) por bloco
+
+
+class BlockStore:
+    def __init__(self, directory, segment_max_bytes=SEGMENT_MAX_BYTES, block_format='json', compression=None):
+        if block_format not in ('json', 'binary'):
+            raise ValueError(f"Formato de bloco desconhecido: {block_format}")
+        if compression is not None:
+            compression_codecs.check_encoding(compression)
+        self.compression = compression # Compressão dos segmentos fechados (None, 'gzip' ou 'zstd')
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.block_format = block_format # Formato dos novos registros; os antigos continuam legíveis
+        os.makedirs(self.directory, exist_ok=True)
+        self.index_file = os.path.join(self.directory, 'index.bin')
+        self._index = []  # [(segmento, offset, tamanho)], posição i = bloco de índice i + 1
+        self._load_index()
+        if self.compression and self._index:
+            for segment in range(self._index[-1][0]): # Todos, menos o segmento atual
+                self._seal(segment)
+
+    def __len__(self):
+        return len(self._index)
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f'segment_{segment:05d}.log')
+
+    def _segment_file(self, segment):
+        """(caminho, compressão) do segmento como está em disco; a versão sem compressão tem prioridade."""
+        path = self._segment_path(segment)
+        if not os.path.exists(path):
+            for encoding, extension in compression_codecs.FILE_EXTENSIONS.items():
+                if os.path.exists(path + extension):
+                    return path + extension, encoding
+        return path, None
+
+    def _open_segment(self, segment):
+        path, encoding = self._segment_file(segment)
+        return compression_codecs.open_compressed(path, encoding) if encoding else open(path, 'rb')
+
+    def _seal(self, segment):
+        """Comprime um segmento que não recebe mais blocos (escrita atômica, depois remove o original)."""
+        path = self._segment_path(segment)
+        if not os.path.exists(path): return
+        compressed = path + compression_codecs.FILE_EXTENSIONS[self.compression]
+        compression_codecs.compress_file(path, compressed + '.tmp', self.compression)
+        os.replace(compressed + '.tmp', compressed)
+        os.remove(path)
+
+    def _unseal(self, segment):
+        """Volta um segmento comprimido para o formato simples (para truncá-lo ou continuar gravando nele)."""
+        path, encoding = self._segment_file(segment)
+        if not encoding: return
+        plain = self._segment_path(segment)
+        with compression_codecs.open_compressed(path, encoding) as src, open(plain + '.tmp', 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(plain + '.tmp', plain)
+        os.remove(path)
+
+    def _load_index(self):
+        """Carrega o índice e descarta registros/bytes de uma gravação interrompida."""
+        if os.path.exists(self.index_file):
+            with open(self.index_file, 'rb') as f:
+                data = f.read()
+            usable = len(data) - len(data) % INDEX_RECORD.size
+            self._index = [INDEX_RECORD.unpack_from(data, pos) for pos in range(0, usable, INDEX_RECORD.size)]
+
+        # Um registro só é válido se os bytes do bloco estiverem completos no segmento
+        while self._index:
+            segment, offset, length = self._index[-1]
+            path, encoding = self._segment_file(segment)
+            if encoding or (os.path.exists(path) and os.path.getsize(path) >= offset + length):
+                break # Segmentos comprimidos já estavam completos quando foram fechados
+            self._index.pop()
+        self._truncate_files(len(self._index))
+
+    def _truncate_files(self, height):
+        """Ajusta índice e segmentos em disco para conter exatamente 'height' blocos."""
+        with open(self.index_file, 'ab') as f:
+            f.truncate(height * INDEX_RECORD.size)
+        if height:
+            segment, offset, length = self._index[height - 1]
+            end = offset + length
+        else:
+            segment, end = 0, 0
+        self._unseal(segment)
+        path = self._segment_path(segment)
+        if os.path.exists(path):
+            with open(path, 'ab') as f:
+                f.truncate(end)
+        for name in os.listdir(self.directory):
+            if name.startswith('segment_') and int(name[8:13]) > segment:
+                os.remove(os.path.join(self.directory, name))
+
+    def append(self, block):
+        """Grava um bloco no fim do log. Custo O(1), independente do tamanho da cadeia."""
+        if self.block_format == 'binary':
+            data = codec.encode(block)
+        else:
+            data = (json.dumps(block, separators=(',', ':')) + '\n').encode('utf-8')
+        if self._index:
+            segment, offset, length = self._index[-1]
+            offset += length
+            if offset >= self.segment_max_bytes:
+                segment, offset = segment + 1, 0
+        else:
+            segment, offset = 0, 0
+
+        # Primeiro os dados, depois o índice: um registro de índice nunca aponta para bytes ausentes
+        with open(self._segment_path(segment), 'ab') as f:
+            f.write(data)
+        record = (segment, offset, len(data))
+        with open(self.index_file, 'ab') as f:
+            f.write(INDEX_RECORD.pack(*record))
+        if self.compression and self._index and self._index[-1][0] != segment:
+            self._seal(self._index[-1][0]) # O segmento anterior acabou de ser fechado
+        self._index.append(record)
+
+    def extend(self, blocks):
+        for block in blocks:
+            self.append(block)
+
+    def truncate(self, height):
+        """Remove todos os blocos acima de 'height' (usado quando a cadeia local é substituída)."""
+        if height >= len(self._index): return
+        del self._index[height:]
+        self._truncate_files(height)
+
+    def read_block(self, index):
+        """Lê um único bloco (índice começando em 1) direto pelo offset."""
+        segment, offset, length = self._index[index - 1]
+        with self._open_segment(segment) as f:
+            f.seek(offset)
+            return codec.decode_record(f.read(length))
+
+    def iter_blocks(self, start=1):
+        """Percorre os blocos a partir de 'start', lendo os segmentos em fluxo, um de cada vez."""
+        f, open_segment = None, None
+        try:
+            for segment, offset, length in self._index[start - 1:]:
+                if segment != open_segment:
+                    if f: f.close()
+                    f, open_segment = self._open_segment(segment), segment
+                    f.seek(offset)
+                yield codec.decode_record(f.read(length)) # Registros de um segmento são contíguos
+        finally:
+            if f: f.close()
+
+
+CHECKPOINTS_TO_KEEP = 3  # Quantos checkpoints de estado manter em disco
+
+
+def _encode_sets(obj):
+    if isinstance(obj, set):
+        return {'__set__': sorted(obj)}
+    raise TypeError(f"Tipo não serializável no checkpoint: {type(obj).__name__}")
+
+
+def _decode_sets(obj):
+    if len(obj) == 1 and '__set__' in obj:
+        return set(obj['__set__'])
+    return obj
+
+
+class CheckpointStore:
+    """Checkpoints do estado (self.state) associados à altura e ao hash do bloco em que foram tirados."""
+
+    def __init__(self, directory, keep=CHECKPOINTS_TO_KEEP):
+        self.directory = directory
+        self.keep = keep
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, height):
+        return os.path.join(self.directory, f'checkpoint_{height:010d}.json')
+
+    def heights(self):
+        """Alturas dos checkpoints existentes, do mais recente para o mais antigo."""
+        return sorted((int(name[11:21]) for name in os.listdir(self.directory)
+                       if name.startswith('checkpoint_') and name.endswith('.json')), reverse=True)
+
+    def save(self, height, block_hash, state):
+        path = self._path(height)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'height': height, 'block_hash': block_hash, 'state': state}, f, default=_encode_sets)
+        os.replace(tmp_path, path)  # Escrita atômica: nunca deixa um checkpoint pela metade
+        for old_height in self.heights()[self.keep:]:
+            self.discard(old_height)
+
+    def load(self, height):
+        """Retorna o checkpoint da altura pedida, ou None se o arquivo estiver ilegível."""
+        try:
+            with open(self._path(height), 'r') as f:
+                return json.load(f, object_hook=_decode_sets)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def discard(self, height):
+        try:
+            os.remove(self._path(height))
+        except FileNotFoundError:
+            pass
+
+    def discard_above(self, height):
+        for checkpoint_height in self.heights():
+            if checkpoint_height > height:
+                self.discard(checkpoint_height)
@@ -0,0 +1,57 @@
+# test_codec.py
+# Testes do formato binário de blocos (codec.py): ida e volta exata e rejeição de entradas inválidas.
+# Uso: python -m pytest -q
+import json
+import time
+import uuid
+
+import pytest
+from Crypto.PublicKey import ECC
+
+import codec
+from blockchain import Blockchain
+
+
+def _public_key():
+    return ECC.generate(curve='P-256').public_key().export_key(format='PEM').strip()
+
+
+def test_codec_round_trips_strings_exactly():
+    pem = _public_key()
+    values = [
+        pem, pem + '\n', pem.replace('\n', '\r\n'), # PEM canônica vira DER; as outras continuam strings
+        'ab' * 32, 'AB' * 32, 'abc', '0', '', 'reward', 'São Paulo', '00ff' * 64,
+    ]
+    for value in values:
+        assert codec.decode(codec.encode(value)) == value
+        assert codec.decode(codec.encode([value, value])) == [value, value] # Segunda ocorrência por referência
+
+
+def test_codec_round_trips_numbers_exactly():
+    values = [0, 1, -1, 127, 128, -129, 2 ** 63, -(2 ** 70), 0.1, -2.5, 1e308, 5e-324, time.time(), 1.0, True, False, None]
+    decoded = codec.decode(codec.encode(values))
+    assert decoded == values
+    assert [type(value) for value in decoded] == [type(value) for value in values]
+    assert json.dumps(decoded) == json.dumps(values)
+
+
+def test_codec_preserves_block_hash():
+    pem = _public_key()
+    block = {'index': 7, 'timestamp': time.time(), 'proof': 123456, 'previous_hash': '%064x' % 99, 'transactions': [
+        {'transaction': {'sender': pem, 'recipient': '0', 'data': {'type': 'REQUEST_SALE_APPROVAL', 'payload': {
+            'request_id': str(uuid.uuid4()), 'token_id': 'CASA-[1]', 'price': 150000, 'ratio': 0.05}}},
+         'signature': '%0128x' % 12345},
+        {'transaction': {'sender': '0', 'recipient': pem, 'data': {'type': 'MINING_REWARD'}}, 'signature': 'reward'},
+    ]}
+    decoded = codec.decode(codec.encode(block))
+    assert decoded == block
+    assert Blockchain.hash(decoded) == Blockchain.hash(block)
+    assert list(decoded) == list(block) # Ordem das chaves preservada
+
+
+def test_codec_rejects_malformed_input_with_value_error():
+    sample = codec.encode({'index': 1, 'values': [1.5, 'x' * 10, 'ab' * 8]})
+    for data in (b'', b'\x00', b'\xb1', b'\xb1\x07', b'\xb1\x04', b'\xb1\x06\x7f', sample[:-1], sample + b'\x00',
+                 b'\xb1\x08\x01\x07\x00\x00', b'\xb1\x08\x01\x08\x00\x00'): # ... e objetos com chave lista/objeto
+        with pytest.raises(ValueError):
+            codec.decode(data)
@@ -0,0 +1,274 @@
+# test_core.py
+# Testes de regressão das partes com invariantes mais delicados:
+# journal de desfazer e reorganização e carga da cadeia.
+# Uso: python -m pytest -q
+import os
+import time
+import uuid
+
+import pytest
+from Crypto.PublicKey import ECC
+
+from blockchain import Blockchain
+from wallet import Wallet
+
+
+def _keypair():
+    key = ECC.generate(curve='P-256')
+    return key.export_key(format='PEM'), key.public_key().export_key(format='PEM').strip()
+
+
+def _ordered(value):
+    """Estado comparável incluindo a ordem dos dicionários (delete_in reordena na reversão).
+
+    O timestamp dos recibos é o relógio na hora do processamento, então fica de fora.
+    """
+    if isinstance(value, dict):
+        return [(key, _ordered(item)) for key, item in value.items() if key != 'timestamp']
+    if isinstance(value, set):
+        return sorted(value)
+    if isinstance(value, list):
+        return [_ordered(item) for item in value]
+    return value
+
+
+class _Network:
+    """Contas e ajudantes para montar cadeias reais (assinaturas e PoW válidos)."""
+
+    def __init__(self):
+        (self.gov_sk, self.gov), (self.tax_sk, self.tax) = _keypair(), _keypair()
+        (self.notary_sk, self.notary), (self.alice_sk, self.alice), (self.bob_sk, self.bob) = _keypair(), _keypair(), _keypair()
+
+    def node(self, port):
+        return Blockchain(port, self.gov, self.tax)
+
+    def submit(self, blockchain, sender_sk, sender, recipient, data):
+        core = {'sender': sender, 'recipient': recipient, 'data': dict(data, nonce=uuid.uuid4().hex)}
+        assert blockchain.add_transaction(sender, recipient, Wallet.sign_transaction(sender_sk, core), core['data'])
+        return Blockchain.hash_transaction(core)
+
+    def mine(self, blockchain):
+        last = blockchain.last_block
+        proof = blockchain.proof_of_work(last['proof'])
+        blockchain.add_transaction("0", self.notary, "reward", {'type': 'MINING_REWARD'})
+        return blockchain.create_block(proof, blockchain.get_block_hash(last['index']))
+
+    def mint(self, blockchain, token_id, owner):
+        return self.submit(blockchain, self.notary_sk, self.notary, owner, {'type': 'MINT_TOKEN', 'payload': {
+            'token_id': token_id, 'asset_type': 'Casa', 'area': '1', 'locality': 'Recife', 'details_hash': 'ab' * 32}})
+
+    def request_sale(self, blockchain, request_id, token_id, seller_sk, seller):
+        return self.submit(blockchain, seller_sk, seller, "0", {'type': 'REQUEST_SALE_APPROVAL', 'payload': {
+            'request_id': request_id, 'token_id': token_id, 'price': 100}})
+
+    def base_chain(self, blockchain):
+        """Cartório registrado em Recife, dois ativos da Alice e saldo para o Bob."""
+        self.submit(blockchain, self.gov_sk, self.gov, self.notary, {'type': 'REGISTER_NOTARY', 'payload': {'locality': 'Recife'}})
+        self.mine(blockchain)
+        self.mint(blockchain, 'CASA-1', self.alice)
+        self.mint(blockchain, 'CASA-2', self.alice)
+        blockchain.add_transaction("0", self.bob, "reward", {'type': 'FAUCET'})
+        blockchain.add_transaction("0", self.bob, "reward", {'type': 'FAUCET', 'n': 2})
+        self.mine(blockchain)
+
+
+@pytest.fixture
+def network(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path) # Blockchain grava em data/ relativo ao diretório atual
+    return _Network()
+
+
+# --- Journal de desfazer e reorganização ---
+
+def test_rewind_and_reapply_restore_identical_state(network):
+    node = network.node(5101)
+    network.base_chain(node)
+    # Três pedidos na mesma localidade; aprovar o primeiro o remove do meio de pending_by_locality
+    for request_id, token_id in (('R1', 'CASA-1'), ('R2', 'CASA-2')):
+        network.request_sale(node, request_id, token_id, network.alice_sk, network.alice)
+    network.mine(node)
+    network.request_sale(node, 'R3', 'CASA-1', network.alice_sk, network.alice)
+    network.mine(node)
+    height, before = len(node.chain), _ordered(node.state)
+    assert list(node.state['pending_by_locality']['Recife']) == ['R1', 'R2', 'R3']
+
+    network.submit(node, network.notary_sk, network.notary, "0", {'type': 'APPROVE_SALE', 'payload': {
+        'request_id': 'R1', 'contract_id': 'C1', 'valid_until': time.time() + 3600}})
+    network.mine(node)
+    network.submit(node, network.bob_sk, network.bob, "0", {'type': 'EXECUTE_SALE_CONTRACT', 'payload': {'contract_id': 'C1'}})
+    network.submit(node, network.notary_sk, network.notary, "0", {'type': 'REJECT_SALE', 'payload': {'request_id': 'R2', 'reason': 'x'}})
+    network.mine(node)
+    after, blocks = _ordered(node.state), node.chain[height:]
+
+    node._rewind(height)
+    assert _ordered(node.state) == before
+    assert list(node.state['pending_by_locality']['Recife']) == ['R1', 'R2', 'R3']
+    for block in blocks:
+        assert node._apply_block(block)
+        node.chain.append(block)
+    assert _ordered(node.state) == after
+
+
+def test_reorganize_matches_forward_application_and_requeues_orphans(network):
+    local = network.node(5102)
+    network.base_chain(local)
+    remote = network.node(5103)
+    remote.chain, remote.state = [], remote._empty_state()
+    remote.store.truncate(0)
+    for block in local.chain:
+        assert remote.add_block(block, signatures_verified=True)
+    fork_height = len(local.chain)
+
+    orphan = network.request_sale(local, 'R-LOCAL', 'CASA-1', network.alice_sk, network.alice)
+    network.mine(local)
+    shared = network.request_sale(local, 'R-SHARED', 'CASA-2', network.alice_sk, network.alice)
+    network.mine(local)
+    remote.mempool.add(local.chain[fork_height + 1]['transactions'][0]) # R-SHARED também entra no ramo remoto
+    for _ in range(3):
+        network.mine(remote)
+
+    blocks = remote.chain[fork_height:]
+    hashes = [remote.get_block_hash(i) for i in range(fork_height + 1, len(remote.chain) + 1)]
+    assert local._reorganize(fork_height, blocks, hashes)
+    assert local.chain == remote.chain
+    assert _ordered(local.state) == _ordered(remote.state)
+    assert [local.get_block_hash(i) for i in range(1, len(local.chain) + 1)] == \
+           [remote.get_block_hash(i) for i in range(1, len(remote.chain) + 1)]
+    # Só a transação que não entrou no ramo adotado volta ao mempool (recompensas ficam de fora)
+    assert [encoded.hash for encoded in local.mempool.encoded()] == [orphan]
+    assert shared in local.state['tx_locations']
+    assert [block['index'] for block in local.store.iter_blocks()] == list(range(1, len(remote.chain) + 1))
+
+
+def _clone(network, source, port):
+    """Nó novo com a mesma cadeia de 'source' (mesmo ponto de partida para dois ramos)."""
+    copy = network.node(port)
+    copy.chain, copy.state = [], copy._empty_state()
+    copy.store.truncate(0)
+    for block in source.chain:
+        assert copy.add_block(block, signatures_verified=True)
+    return copy
+
+
+def test_sync_after_restart_adopts_branch_without_replaying_its_transactions(network):
+    local = network.node(5105)
+    network.base_chain(local)
+    remote = _clone(network, local, 5106)
+    fork_height = len(local.chain)
+    network.mine(local) # Bloco local que vai ficar órfão
+
+    local = network.node(5105) # Reinício: sem journals, a reorganização passa por _adopt_chain
+    assert not local._undo_journals
+    transfer = {'type': 'TRANSFER_CURRENCY', 'payload': {'amount': 30}}
+    transfer_hash = network.submit(remote, network.bob_sk, network.bob, network.alice, transfer)
+    gossiped = next(remote.mempool.encoded())
+    local.mempool.add(gossiped) # A mesma transferência chegou por gossip
+    for _ in range(2):
+        network.mine(remote)
+
+    candidate = {'length': len(remote.chain), 'fork_height': fork_height, 'fork_hash': local.get_block_hash(fork_height),
+                 'blocks': remote.chain[fork_height:],
+                 'hashes': [remote.get_block_hash(i) for i in range(fork_height + 1, len(remote.chain) + 1)]}
+    assert local.apply_sync_candidate(candidate)
+    assert local.chain == remote.chain and _ordered(local.state) == _ordered(remote.state)
+    assert transfer_hash not in local.mempool
+
+    bob_balance = local.get_balance(network.bob)
+    local.mempool.add(gossiped) # Cópia atrasada: create_block não pode repeti-la
+    block = network.mine(local)
+    assert local.get_balance(network.bob) == bob_balance
+    assert all(tx['transaction']['sender'] != network.bob for tx in block['transactions'])
+
+
+# --- Checkpoints ---
+
+def test_checkpoint_restore_matches_full_reindex(network, monkeypatch):
+    node = network.node(5107)
+    network.base_chain(node)
+    network.request_sale(node, 'R1', 'CASA-1', network.alice_sk, network.alice)
+    network.mine(node)
+    node.save_checkpoint()
+    checkpoint_height = len(node.chain)
+    network.request_sale(node, 'R2', 'CASA-2', network.alice_sk, network.alice)
+    network.mine(node)
+
+    reindexed = Blockchain(5107, network.gov, network.tax, reindex=True)
+    calls = []
+    monkeypatch.setattr(Blockchain, 'rebuild_state_from_chain', lambda self: calls.append(len(self.chain)))
+    restored = network.node(5107)
+    assert not calls # Estado veio do checkpoint + blocos posteriores, sem reprocessar desde o gênesis
+    assert restored.checkpoints.heights() == [checkpoint_height]
+    assert _ordered(restored.state) == _ordered(reindexed.state) == _ordered(node.state)
+
+
+def test_checkpoint_that_does_not_match_the_chain_is_discarded(network):
+    node = network.node(5108)
+    network.base_chain(node)
+    node.save_checkpoint()
+    height = len(node.chain)
+    checkpoint = node.checkpoints.load(height)
+
+    # Checkpoint de outra cadeia (hash diferente) e de uma versão com outras tabelas de estado
+    node.checkpoints.save(height, '00' * 32, checkpoint['state'])
+    node.checkpoints.save(height - 1, node.get_block_hash(height - 1), {'balances': {}})
+    restarted = network.node(5108)
+    assert restarted.checkpoints.heights() == []
+    assert _ordered(restarted.state) == _ordered(node.state)
+
+
+# --- Recibos de imposto ---
+
+def _sell(network, node, token_id, seller, buyer, price):
+    (seller_sk, seller_pk), (buyer_sk, buyer_pk) = seller, buyer
+    request_id, contract_id = str(uuid.uuid4()), str(uuid.uuid4())
+    network.submit(node, seller_sk, seller_pk, "0", {'type': 'REQUEST_SALE_APPROVAL', 'payload': {
+        'request_id': request_id, 'token_id': token_id, 'price': price}})
+    network.mine(node)
+    network.submit(node, network.notary_sk, network.notary, "0", {'type': 'APPROVE_SALE', 'payload': {
+        'request_id': request_id, 'contract_id': contract_id, 'valid_until': time.time() + 3600}})
+    network.submit(node, buyer_sk, buyer_pk, "0", {'type': 'EXECUTE_SALE_CONTRACT', 'payload': {'contract_id': contract_id}})
+    return network.mine(node)['index']
+
+
+def test_tax_receipts_cursor_paging_and_filters(network):
+    node = network.node(5109)
+    network.base_chain(node)
+    node.add_transaction("0", network.alice, "reward", {'type': 'FAUCET'})
+    alice, bob = (network.alice_sk, network.alice), (network.bob_sk, network.bob)
+    blocks = [_sell(network, node, 'CASA-1', alice, bob, 10), _sell(network, node, 'CASA-1', bob, alice, 20),
+              _sell(network, node, 'CASA-2', alice, bob, 30), _sell(network, node, 'CASA-2', bob, alice, 40)]
+    receipts = node.state['tax_receipts']
+    assert [r['block_index'] for r in receipts] == blocks and [r['price'] for r in receipts] == [10, 20, 30, 40]
+
+    def all_pages(**filters):
+        pages, cursor = [], None
+        while True:
+            page, cursor = node.query_tax_receipts(cursor=cursor, limit=1, **filters)
+            pages.extend(r['price'] for r in page)
+            if cursor is None: return pages
+
+    assert all_pages() == [10, 20, 30, 40]
+    assert all_pages(buyer=network.bob) == [10, 30] and all_pages(seller=network.bob + '\n') == [20, 40]
+    assert all_pages(token_id='CASA-2') == [30, 40] and all_pages(token_id='CASA-2', buyer=network.alice) == [40]
+    assert all_pages(from_block=blocks[1], to_block=blocks[2]) == [20, 30]
+    assert all_pages(buyer=network.alice, from_block=blocks[2]) == [40]
+    assert node.query_tax_receipts(limit=4) == (receipts, None) # Página exata: sem cursor para uma página vazia
+    assert node.query_tax_receipts(cursor=3) == ([], None)
+
+
+# --- Carga da cadeia ---
+
+@pytest.mark.parametrize('block_format', ['json', 'binary'])
+def test_unreadable_block_log_restarts_from_a_persisted_genesis(network, block_format):
+    node = Blockchain(5104, network.gov, network.tax, block_format=block_format)
+    network.base_chain(node)
+    segment = os.path.join(node.store.directory, 'segment_00000.log')
+    with open(segment, 'r+b') as f: # Corrompe o segundo registro: JSON inválido / objeto com chave lista
+        f.seek(node.store._index[1][1] + 1)
+        f.write(b'@@@' if block_format == 'json' else b'\x08\x01\x07')
+
+    node = Blockchain(5104, network.gov, network.tax, block_format=block_format)
+    assert len(node.chain) == len(node.store) == 1
+    network.mine(node)
+    restarted = Blockchain(5104, network.gov, network.tax, block_format=block_format)
+    assert restarted.chain == node.chain and len(restarted.store) == 2
@@ -0,0 +1,55 @@
+# test_mempool.py
+# Testes do mempool: ordem de chegada, duplicatas, descarte por limite e devolução de transações órfãs.
+# Uso: python -m pytest -q
+from mempool import Mempool
+from transaction import EncodedTransaction
+
+
+def _tx(n, padding=0):
+    return EncodedTransaction({'transaction': {'sender': 'a' * 40, 'recipient': 'b' * 40,
+                                               'data': {'type': 'TRANSFER_CURRENCY', 'payload': {'amount': n}, 'pad': 'x' * padding}},
+                               'signature': '%064x' % n})
+
+
+def test_add_keeps_arrival_order_and_rejects_duplicates():
+    mempool = Mempool()
+    txs = [_tx(n) for n in range(5)]
+    assert [mempool.add(tx) for tx in txs] == [tx.hash for tx in txs]
+    assert mempool.add(_tx(2)) is None # Mesma transação, outro objeto
+    assert mempool.add(txs[0].tx_data) is None # Também como item de bloco
+    assert [encoded.hash for encoded in mempool.encoded()] == [tx.hash for tx in txs]
+    assert list(mempool) == [tx.tx_data for tx in txs]
+    assert mempool.duplicates == 2 and len(mempool) == 5
+    assert mempool.total_bytes == sum(tx.size for tx in txs)
+
+
+def test_eviction_drops_oldest_first_by_count_and_by_bytes():
+    by_count = Mempool(max_transactions=3)
+    txs = [_tx(n) for n in range(5)]
+    for tx in txs:
+        by_count.add(tx)
+    assert [encoded.hash for encoded in by_count.encoded()] == [tx.hash for tx in txs[2:]]
+    assert by_count.evicted == 2
+
+    big = [_tx(n, padding=400) for n in range(4)]
+    by_bytes = Mempool(max_bytes=big[0].size * 2 + 10)
+    for tx in big:
+        by_bytes.add(tx)
+    assert [encoded.hash for encoded in by_bytes.encoded()] == [tx.hash for tx in big[2:]]
+    assert by_bytes.total_bytes == big[2].size + big[3].size and by_bytes.evicted == 2
+    assert by_bytes.add(_tx(99, padding=by_bytes.max_bytes)) is None # Maior que o mempool inteiro: recusada sem descartar nada
+    assert len(by_bytes) == 2
+
+
+def test_remove_many_and_requeue_put_orphans_back_in_front():
+    mempool = Mempool(max_transactions=4)
+    pending = [_tx(n) for n in range(10, 13)]
+    for tx in pending:
+        mempool.add(tx)
+    assert mempool.remove_many([pending[1].hash, 'inexistente']) == 1
+    assert mempool.total_bytes == pending[0].size + pending[2].size
+
+    orphans = [_tx(n) for n in range(3)] + [pending[0]] # Uma delas já está na fila
+    assert mempool.requeue(orphans) == 2 # Só cabem duas: as mais antigas ficam de fora
+    assert [encoded.hash for encoded in mempool.encoded()] == [orphans[1].hash, orphans[2].hash, pending[0].hash, pending[2].hash]
+    assert mempool.evicted == 1 and mempool.total_bytes == sum(encoded.size for encoded in mempool.encoded())
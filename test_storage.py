@@ -0,0 +1,88 @@
+# test_storage.py
+# Testes do log de blocos (BlockStore) e da compressão usada no disco e na rede.
+# Uso: python -m pytest -q
+import os
+
+import pytest
+
+import codec
+import compression
+from storage import BlockStore
+
+
+def _blocks(count, start=1):
+    return [{'index': i, 'timestamp': 1700000000.0 + i, 'transactions': [{'transaction': {
+        'sender': '0', 'recipient': 'r' * 40, 'data': {'type': 'FAUCET', 'n': i}}, 'signature': 'reward'}],
+        'proof': i * 7, 'previous_hash': '%064x' % i} for i in range(start, start + count)]
+
+
+def test_store_recovers_from_torn_writes(tmp_path):
+    directory = str(tmp_path / 'blocks')
+    store = BlockStore(directory)
+    store.extend(_blocks(3))
+    segment = os.path.join(directory, 'segment_00000.log')
+    complete_size = os.path.getsize(segment)
+
+    with open(segment, 'ab') as f: # Dados gravados, índice não
+        f.write(b'{"index":4,"timest')
+    with open(store.index_file, 'ab') as f: # Registro de índice pela metade
+        f.write(b'\x00\x01\x02')
+    store = BlockStore(directory)
+    assert len(store) == 3 and os.path.getsize(segment) == complete_size
+    assert list(store.iter_blocks()) == _blocks(3)
+
+    with open(segment, 'ab') as f: # Índice gravado, dados do bloco incompletos
+        f.truncate(complete_size - 5)
+    store = BlockStore(directory)
+    assert len(store) == 2 and list(store.iter_blocks()) == _blocks(2)
+    store.append(_blocks(1, start=3)[0])
+    assert list(BlockStore(directory).iter_blocks()) == _blocks(3)
+
+
+def test_store_truncates_across_sealed_segments(tmp_path):
+    directory = str(tmp_path / 'blocks')
+    store = BlockStore(directory, segment_max_bytes=600, compression='gzip')
+    store.extend(_blocks(20))
+    sealed = [name for name in os.listdir(directory) if name.endswith('.gz')]
+    assert len(sealed) >= 3
+
+    store.truncate(5)
+    assert list(store.iter_blocks()) == _blocks(5)
+    last_segment = store._index[-1][0]
+    assert all(int(name[8:13]) <= last_segment for name in os.listdir(directory) if name.startswith('segment_'))
+    store.extend(_blocks(10, start=6))
+    reopened = BlockStore(directory, segment_max_bytes=600, compression='gzip')
+    assert list(reopened.iter_blocks()) == _blocks(15)
+    assert reopened.read_block(2) == _blocks(1, start=2)[0] and reopened.read_block(15) == _blocks(1, start=15)[0]
+
+
+def test_store_reads_mixed_json_and_binary_records(tmp_path):
+    directory = str(tmp_path / 'blocks')
+    BlockStore(directory).extend(_blocks(3))
+    store = BlockStore(directory, block_format='binary')
+    store.extend(_blocks(3, start=4))
+    with open(os.path.join(directory, 'segment_00000.log'), 'rb') as f:
+        data = f.read()
+    assert data.startswith(b'{') and codec.MAGIC in data
+    reopened = BlockStore(directory)
+    assert list(reopened.iter_blocks()) == _blocks(6)
+    assert [reopened.read_block(i)['index'] for i in (1, 3, 4, 6)] == [1, 3, 4, 6]
+    assert list(reopened.iter_blocks(start=3)) == _blocks(4, start=3)
+
+
+@pytest.mark.parametrize('encoding', compression.ENCODINGS)
+def test_decompress_round_trips_and_rejects_corrupt_bodies(encoding):
+    data = b''.join(b'%d,' % i for i in range(20000))
+    compressed = compression.compress(data, encoding)
+    assert compression.decompress(compressed, encoding) == data
+    assert compression.decompress(compressed, encoding, max_size=len(data)) == data
+    for corrupt in (compressed[:-4], compressed[:len(compressed) // 2], b'nada comprimido', compressed + b'\x00'):
+        with pytest.raises(ValueError):
+            compression.decompress(corrupt, encoding)
+
+
+@pytest.mark.parametrize('encoding', compression.ENCODINGS)
+def test_decompress_stops_at_max_size(encoding):
+    bomb = compression.compress(b'\x00' * (8 * 1024 * 1024), encoding)
+    with pytest.raises(compression.DecompressedTooLarge):
+        compression.decompress(bomb, encoding, max_size=1024 * 1024)
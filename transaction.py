@@ -0,0 +1,74 @@
+# transaction.py
+# Serializações canônicas de uma transação, calculadas uma única vez e reaproveitadas
+# na assinatura, na verificação, no hash, na deduplicação e no hash do bloco.
+import hashlib
+import json
+
+
+class EncodedTransaction:
+    """Envolve um item de bloco ({'transaction': {...}, 'signature': ...}) sem alterá-lo.
+
+    Cada serialização é calculada na primeira vez em que é pedida e guardada:
+    - signing_bytes: JSON compacto da transação, que é o que a carteira assina e verifica;
+    - encoded/hash: JSON da transação no formato de Blockchain.hash (chaves ordenadas) e seu SHA-256;
+    - block_fragment: o item inteiro como aparece em json.dumps(bloco, sort_keys=True).
+    """
+    __slots__ = ('tx_data', '_signing_bytes', '_encoded', '_hash', '_block_fragment')
+
+    def __init__(self, tx_data):
+        self.tx_data = tx_data
+        self._signing_bytes = self._encoded = self._hash = self._block_fragment = None
+
+    @property
+    def transaction(self):
+        return self.tx_data['transaction']
+
+    @property
+    def signature(self):
+        return self.tx_data.get('signature', '')
+
+    @property
+    def signing_bytes(self):
+        if self._signing_bytes is None:
+            self._signing_bytes = json.dumps(self.transaction, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        return self._signing_bytes
+
+    @property
+    def encoded(self):
+        if self._encoded is None:
+            self._encoded = json.dumps(self.transaction, sort_keys=True)
+        return self._encoded
+
+    @property
+    def hash(self):
+        if self._hash is None:
+            self._hash = hashlib.sha256(self.encoded.encode()).hexdigest()
+        return self._hash
+
+    @property
+    def size(self):
+        return len(self.encoded)
+
+    @property
+    def block_fragment(self):
+        if self._block_fragment is None:
+            if set(self.tx_data) == {'signature', 'transaction'}:
+                self._block_fragment = (f'{{"signature": {json.dumps(self.tx_data["signature"])}, '
+                                        f'"transaction": {self.encoded}}}')
+            else: # Formato inesperado: serializa o item inteiro
+                self._block_fragment = json.dumps(self.tx_data, sort_keys=True)
+        return self._block_fragment
+
+
+def encode_transactions(block):
+    return [EncodedTransaction(tx_data) for tx_data in block.get('transactions', [])]
+
+
+def hash_block(block, encoded_transactions):
+    """Mesmo resultado de Blockchain.hash(block), montado a partir das transações já serializadas."""
+    header = {key: value for key, value in block.items() if key != 'transactions'}
+    if not header or 'transactions' not in block or max(header) > 'transactions':
+        return hashlib.sha256(json.dumps(block, sort_keys=True).encode()).hexdigest()
+    transactions = ', '.join(encoded.block_fragment for encoded in encoded_transactions)
+    data = f'{json.dumps(header, sort_keys=True)[:-1]}, "transactions": [{transactions}]}}'
+    return hashlib.sha256(data.encode()).hexdigest()
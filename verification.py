@@ -0,0 +1,87 @@
+# verification.py
+# Verificação paralela das assinaturas ECDSA das transações de blocos recebidos.
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from transaction import EncodedTransaction
+from wallet import Wallet
+
+BATCH_SIZE = 64         # Transações por tarefa enviada a um processo
+INLINE_THRESHOLD = 16   # Abaixo disso verifica no próprio processo (o IPC custaria mais que a verificação)
+
+
+def signed_transactions(blocks):
+    """Transações de 'blocks' que exigem assinatura (todas, exceto recompensas/faucet do sistema)."""
+    return [tx_data for block in blocks for tx_data in block['transactions']
+            if tx_data['transaction']['sender'] != "0"]
+
+
+def _verify_batch(batch):
+    """Retorna a posição (dentro do lote) da primeira assinatura inválida, ou None se todas forem válidas.
+
+    Aceita itens de bloco ou EncodedTransaction (que já trazem os bytes assinados).
+    """
+    for position, item in enumerate(batch):
+        encoded = item if isinstance(item, EncodedTransaction) else EncodedTransaction(item)
+        if not Wallet.verify_transaction(encoded.transaction['sender'], encoded, encoded.signature):
+            return position
+    return None
+
+
+def _verify_batch_in_worker(batch):
+    """Como _verify_batch, no processo do pool; devolve também os acertos/faltas do cache de chaves do processo no lote."""
+    before = Wallet.verifier_cache_stats()
+    position = _verify_batch(batch)
+    after = Wallet.verifier_cache_stats()
+    return position, after['hits'] - before['hits'], after['misses'] - before['misses']
+
+
+def find_invalid_signature(transactions):
+    """Versão serial: primeira transação com assinatura inválida, ou None."""
+    position = _verify_batch(transactions)
+    return None if position is None else transactions[position]
+
+
+class SignatureVerifier:
+    """Distribui lotes de transações entre processos e para no primeiro lote com assinatura inválida."""
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        context = multiprocessing.get_context('spawn')
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        self._lock = threading.Lock()
+        self.worker_cache_hits = 0   # Cache de chaves públicas dos processos (cada um tem o seu)
+        self.worker_cache_misses = 0
+
+    def find_invalid(self, transactions):
+        """Retorna a primeira transação com assinatura inválida encontrada, ou None se todas forem válidas."""
+        if len(transactions) < INLINE_THRESHOLD or self.workers == 1:
+            return find_invalid_signature(transactions)
+
+        batches = {}
+        for start in range(0, len(transactions), BATCH_SIZE):
+            batches[self._pool.submit(_verify_batch_in_worker, transactions[start:start + BATCH_SIZE])] = start
+        pending = set(batches)
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    position, hits, misses = future.result()
+                    with self._lock:
+                        self.worker_cache_hits += hits
+                        self.worker_cache_misses += misses
+                    if position is not None:
+                        return transactions[batches[future] + position]
+            return None
+        finally:
+            for future in pending:
+                future.cancel() # Bloco já rejeitado: descarta os lotes que ainda não começaram
+
+    def cache_stats(self):
+        """Acertos e faltas somados do cache de chaves públicas dos processos do pool."""
+        with self._lock:
+            return {'hits': self.worker_cache_hits, 'misses': self.worker_cache_misses, 'workers': self.workers}
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -6,10 +6,20 @@ from Crypto.Protocol.KDF import PBKDF2
 from Crypto.Cipher import AES
 from Crypto.Random import get_random_bytes
 import binascii
+import functools
 import json
 import os
+from transaction import EncodedTransaction
 
 WALLET_DIR = os.path.join("data", "wallets")
+VERIFIER_KEY_CACHE_SIZE = 1024 # Chaves públicas já interpretadas mantidas em memória (LRU)
+
+
+@functools.lru_cache(maxsize=VERIFIER_KEY_CACHE_SIZE)
+def _import_verifier_key(normalized_pem):
+    # Interpretar o PEM/DER e decodificar o ponto da curva é a parte cara da verificação;
+    # os mesmos poucos cartórios e o governo assinam a maioria das transações.
+    return ECC.import_key(normalized_pem)
 
 class Wallet:
     def __init__(self):
@@ -113,12 +123,19 @@ class Wallet:
             self.public_key = None
             return False
 
+    @staticmethod
+    def signing_bytes(transaction):
+        """Bytes assinados: reaproveita os de uma EncodedTransaction ou serializa o dicionário."""
+        if isinstance(transaction, EncodedTransaction):
+            return transaction.signing_bytes
+        return json.dumps(transaction, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
     @staticmethod
     def sign_transaction(private_key_pem, transaction):
         try:
             key = ECC.import_key(private_key_pem)
             signer = DSS.new(key, 'fips-186-3')
-            tx_string = json.dumps(transaction, sort_keys=True, separators=(',', ':')).encode('utf-8')
+            tx_string = Wallet.signing_bytes(transaction)
             h = SHA256.new(tx_string)
             signature = signer.sign(h)
             return binascii.hexlify(signature).decode('ascii')
@@ -127,13 +144,28 @@ class Wallet:
             return None
 
 
+    @staticmethod
+    def normalize_public_key(public_key_pem):
+        """Forma canônica do PEM usada como chave do cache (sem espaços nas bordas e com quebras '\\n')."""
+        return public_key_pem.strip().replace('\r\n', '\n')
+
+    @staticmethod
+    def verifier_cache_stats():
+        """Acertos, faltas e ocupação do cache de chaves públicas deste processo.
+
+        Só cobre as verificações feitas aqui (add_transaction e blocos pequenos); as dos processos do
+        SignatureVerifier são contadas por SignatureVerifier.cache_stats().
+        """
+        info = _import_verifier_key.cache_info()
+        return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'max_size': info.maxsize}
+
     @staticmethod
     def verify_transaction(public_key_pem, transaction, signature):
         try:
             # CORREÇÃO MANTIDA: A biblioteca de criptografia precisa da chave limpa
-            key = ECC.import_key(public_key_pem.strip())
+            key = _import_verifier_key(Wallet.normalize_public_key(public_key_pem))
             verifier = DSS.new(key, 'fips-186-3')
-            tx_string = json.dumps(transaction, sort_keys=True, separators=(',', ':')).encode('utf-8')
+            tx_string = Wallet.signing_bytes(transaction)
             h = SHA256.new(tx_string)
             verifier.verify(h, binascii.unhexlify(signature))
             return True